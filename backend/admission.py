@@ -0,0 +1,189 @@
+"""
+Control de admisión para /analyze.
+Limita cuántos análisis corren a la vez (con una cola de espera acotada)
+y cuántos puede pedir cada cliente (token bucket por IP o API key).
+Cuando se supera un límite responde 429 con Retry-After de inmediato.
+"""
+
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException, Request
+
+# Configuración (se puede ajustar con variables de entorno)
+MAX_CONCURRENT = int(os.environ.get("ANALYZE_MAX_CONCURRENT", "4"))
+MAX_QUEUE = int(os.environ.get("ANALYZE_MAX_QUEUE", "8"))
+QUEUE_TIMEOUT = float(os.environ.get("ANALYZE_QUEUE_TIMEOUT", "20"))
+RATE_PER_MINUTE = float(os.environ.get("ANALYZE_RATE_PER_MINUTE", "6"))
+BURST = float(os.environ.get("ANALYZE_BURST", "3"))
+
+# API keys válidas (separadas por coma); un X-API-Key desconocido se ignora
+API_KEYS = {k.strip() for k in os.environ.get("ANALYZE_API_KEYS", "").split(",") if k.strip()}
+
+# Solo detrás de un proxy que agrega la IP real a X-Forwarded-For (como Render):
+# sin proxy, el cliente puede escribir ese header y elegir su propio bucket
+TRUST_PROXY = os.environ.get("ANALYZE_TRUST_PROXY", "0") == "1"
+
+# Máximo de clientes recordados (se olvidan los menos recientes)
+MAX_CLIENTS = 10000
+
+# Cuántas mediciones recientes se guardan para percentiles
+_SAMPLES = 500
+
+_semaphore = asyncio.Semaphore(MAX_CONCURRENT)
+_active = 0
+_waiting = 0
+_buckets = OrderedDict()
+
+_metrics = {
+    "admitted": 0,
+    "rejected": {"rate_limited": 0, "queue_full": 0, "queue_timeout": 0},
+    "wait_total": 0.0,
+    "wait_max": 0.0,
+}
+_wait_samples = deque(maxlen=_SAMPLES)
+_service_samples = deque(maxlen=_SAMPLES)
+
+
+def client_key(request: Request) -> str:
+    """
+    Identifica al cliente por API key válida o, si no hay, por IP.
+    Una key que no está en ANALYZE_API_KEYS no cuenta: si no, cada key
+    inventada tendría su propio bucket.
+    """
+    api_key = request.headers.get("x-api-key")
+    if api_key and api_key in API_KEYS:
+        return f"key:{api_key}"
+
+    # Detrás del proxy la IP real es la que agrega al final de X-Forwarded-For;
+    # las entradas anteriores las puede escribir el cliente
+    forwarded = request.headers.get("x-forwarded-for") if TRUST_PROXY else None
+    if forwarded:
+        return f"ip:{forwarded.split(',')[-1].strip()}"
+
+    return f"ip:{request.client.host if request.client else 'desconocido'}"
+
+
+def _take_token(key: str) -> float:
+    """
+    Consume un token del bucket del cliente.
+    Retorna 0 si se permitió, o los segundos a esperar para el próximo token.
+    """
+    now = time.monotonic()
+    rate = RATE_PER_MINUTE / 60.0
+
+    tokens, last = _buckets.pop(key, (BURST, now))
+    tokens = min(BURST, tokens + (now - last) * rate)
+
+    if tokens >= 1:
+        _buckets[key] = (tokens - 1, now)
+        wait = 0.0
+    else:
+        _buckets[key] = (tokens, now)
+        wait = (1 - tokens) / rate if rate > 0 else 60.0
+
+    # Olvidar clientes viejos para acotar memoria
+    while len(_buckets) > MAX_CLIENTS:
+        _buckets.popitem(last=False)
+
+    return wait
+
+
+def _percentile(samples, fraction: float) -> float:
+    """Percentil aproximado de una lista de mediciones."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _estimated_wait() -> float:
+    """Estima cuánto falta para que se libere un lugar (para Retry-After)."""
+    service = _percentile(_service_samples, 0.5) or 30.0
+    return service * (_waiting + 1) / max(MAX_CONCURRENT, 1)
+
+
+def _reject(reason: str, retry_after: float, detail: str):
+    """Registra el rechazo y responde 429."""
+    _metrics["rejected"][reason] += 1
+    raise HTTPException(
+        status_code=429,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+
+@asynccontextmanager
+async def admit(key: str):
+    """
+    Espera un lugar para ejecutar un análisis.
+    Rechaza con 429 si la cola está llena o si el cliente superó su límite.
+    """
+    global _active, _waiting
+
+    # La cola se revisa antes de cobrar el token: un rechazo por carga del
+    # servidor no le descuenta análisis al cliente.
+    # Contadores propios: el semáforo no refleja a quienes aún no llegaron a esperar
+    if _active + _waiting >= MAX_CONCURRENT + MAX_QUEUE:
+        _reject("queue_full", _estimated_wait(), "El servidor está ocupado. Intenta más tarde.")
+
+    wait = _take_token(key)
+    if wait > 0:
+        _reject("rate_limited", wait, "Demasiados análisis seguidos. Intenta más tarde.")
+
+    started = time.monotonic()
+    _waiting += 1
+    try:
+        await asyncio.wait_for(_semaphore.acquire(), timeout=QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        _reject("queue_timeout", _estimated_wait(), "El servidor está ocupado. Intenta más tarde.")
+    finally:
+        _waiting -= 1
+
+    waited = time.monotonic() - started
+    _metrics["admitted"] += 1
+    _metrics["wait_total"] += waited
+    _metrics["wait_max"] = max(_metrics["wait_max"], waited)
+    _wait_samples.append(waited)
+
+    _active += 1
+    service_start = time.monotonic()
+    try:
+        yield
+    finally:
+        _active -= 1
+        _service_samples.append(time.monotonic() - service_start)
+        _semaphore.release()
+
+
+def get_metrics() -> dict:
+    """Métricas de la cola de /analyze."""
+    admitted = _metrics["admitted"]
+    return {
+        "limits": {
+            "max_concurrent": MAX_CONCURRENT,
+            "max_queue": MAX_QUEUE,
+            "queue_timeout": QUEUE_TIMEOUT,
+            "rate_per_minute": RATE_PER_MINUTE,
+            "burst": BURST,
+        },
+        "active": _active,
+        "queue_depth": _waiting,
+        "admitted": admitted,
+        "rejected": dict(_metrics["rejected"]),
+        "wait_seconds": {
+            "mean": round(_metrics["wait_total"] / admitted, 3) if admitted else 0.0,
+            "p50": round(_percentile(_wait_samples, 0.5), 3),
+            "p95": round(_percentile(_wait_samples, 0.95), 3),
+            "max": round(_metrics["wait_max"], 3),
+        },
+        "service_seconds": {
+            "p50": round(_percentile(_service_samples, 0.5), 3),
+            "p95": round(_percentile(_service_samples, 0.95), 3),
+        },
+        "tracked_clients": len(_buckets),
+    }
@@ -0,0 +1,325 @@
+"""
+Motor de analítica columnar sobre las reseñas guardadas.
+Mantiene arreglos NumPy (rubro, rating, sentimiento, bot, confianza, fecha)
+que se actualizan incrementalmente con cada análisis y permiten
+agrupar, filtrar y agregar sin recorrer diccionarios.
+"""
+
+import threading
+from datetime import datetime
+from typing import Callable, Optional
+
+import numpy as np
+
+from categories import CATEGORIES
+from reviews import SENTIMENTS, BOT_CLASSES, SENTIMENT_CODES, BOT_CODES
+
+# Dimensiones por las que se puede agrupar
+DIMENSIONS = ["category", "business", "sentiment", "bot_classification", "rating"]
+MEASURES = ["count", "mean_rating", "mean_confidence", "bot_share", "suspicious_share", "confidence_hist"]
+
+# Tipos de cada columna
+_DTYPES = {
+    "business": np.int32,
+    "category": np.int16,
+    "rating": np.int8,
+    "sentiment": np.int8,
+    "bot_classification": np.int8,
+    "confidence": np.float32,
+    "date": np.float64,
+    "alive": np.bool_,
+}
+
+_lock = threading.Lock()
+_load_done = threading.Condition(_lock)
+_loaded = False
+# Análisis guardados mientras se lee el historial (None si no hay una carga en curso)
+_pending = None
+_size = 0
+_dead = 0
+_columns = {}
+
+# Diccionarios de códigos
+_category_keys = list(CATEGORIES.keys())
+_category_codes = {c: i for i, c in enumerate(_category_keys)}
+_business_keys = []
+_business_names = []
+_business_codes = {}
+# Filas que ocupa cada negocio (inicio, fin)
+_business_rows = {}
+
+
+def _reset_columns(capacity: int = 1024):
+    """Reinicia las columnas con la capacidad indicada."""
+    global _size, _dead, _columns
+    _size = 0
+    _dead = 0
+    _columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in _DTYPES.items()}
+    _business_rows.clear()
+
+
+def _reserve(extra: int):
+    """Asegura espacio para `extra` filas más (duplica la capacidad)."""
+    capacity = len(_columns["alive"])
+    if _size + extra <= capacity:
+        return
+    new_capacity = max(capacity * 2, _size + extra)
+    for name, column in _columns.items():
+        grown = np.zeros(new_capacity, dtype=column.dtype)
+        grown[:_size] = column[:_size]
+        _columns[name] = grown
+
+
+def _compact():
+    """Elimina las filas de análisis reemplazados."""
+    global _size, _dead
+    # Copiar la máscara: la columna "alive" se sobrescribe dentro del ciclo
+    alive = _columns["alive"][:_size].copy()
+    for name in _columns:
+        kept = _columns[name][:_size][alive]
+        _columns[name][:len(kept)] = kept
+    _size = int(alive.sum())
+    _dead = 0
+
+    # Recalcular rangos: las filas de cada negocio siguen contiguas
+    _business_rows.clear()
+    business = _columns["business"][:_size]
+    if _size:
+        starts = np.flatnonzero(np.r_[True, business[1:] != business[:-1]])
+        ends = np.r_[starts[1:], _size]
+        for start, end in zip(starts, ends):
+            _business_rows[_business_keys[business[start]]] = (int(start), int(end))
+
+
+def _code(codes: dict, keys: list, value: str) -> int:
+    """Obtiene (o crea) el código de un valor categórico."""
+    if value not in codes:
+        codes[value] = len(keys)
+        keys.append(value)
+    return codes[value]
+
+
+def _index(business: dict):
+    """Agrega las reseñas de un negocio a las columnas (sin lock)."""
+    global _size, _dead
+
+    url = business.get("url", "")
+    if url in _business_rows:
+        # Re-análisis: marcar las filas anteriores como eliminadas
+        start, end = _business_rows.pop(url)
+        _columns["alive"][start:end] = False
+        _dead += end - start
+
+    business_code = _code(_business_codes, _business_keys, url)
+    if business_code == len(_business_names):
+        _business_names.append(business.get("name", ""))
+    else:
+        _business_names[business_code] = business.get("name", "")
+
+    category_id = business.get("category", {}).get("category_id", "otros")
+    category_code = _code(_category_codes, _category_keys, category_id)
+
+    try:
+        date = datetime.fromisoformat(business.get("analyzed_at")).timestamp()
+    except (TypeError, ValueError):
+        date = 0.0
+
+    reviews = business.get("reviews", [])
+    n = len(reviews)
+    _reserve(n)
+
+    rows = slice(_size, _size + n)
+    _columns["business"][rows] = business_code
+    _columns["category"][rows] = category_code
+    _columns["date"][rows] = date
+    _columns["alive"][rows] = True
+    _columns["rating"][rows] = [min(max(int(r.get("rating", 0) or 0), 0), 5) for r in reviews]
+    _columns["sentiment"][rows] = [SENTIMENT_CODES.get(r.get("sentiment"), 1) for r in reviews]
+    _columns["bot_classification"][rows] = [BOT_CODES.get(r.get("bot_classification"), 0) for r in reviews]
+    _columns["confidence"][rows] = [float(r.get("confidence", 0) or 0) for r in reviews]
+
+    _business_rows[url] = (_size, _size + n)
+    _size += n
+
+    if _dead > _size // 2:
+        _compact()
+
+
+def start_loading():
+    """
+    Anuncia que otro hilo va a leer el historial para cargar las columnas (ver finish_loading).
+    Mientras tanto los análisis nuevos quedan en espera y ensure_loaded espera a esa carga.
+    """
+    global _pending
+    with _lock:
+        if not _loaded and _pending is None:
+            _pending = []
+
+
+def finish_loading(analyses: Optional[list]):
+    """
+    Carga las columnas con el historial ya leído (None si la lectura falló)
+    y aplica los análisis guardados mientras tanto.
+    """
+    global _loaded, _pending
+    with _lock:
+        if not _loaded and analyses is not None:
+            _reset_columns()
+            for business in analyses:
+                _index(business)
+            for business in _pending or []:
+                _index(business)
+            _loaded = True
+        _pending = None
+        _load_done.notify_all()
+
+
+def ensure_loaded(loader: Callable[[], list]):
+    """Carga las columnas desde el historial la primera vez que se consultan."""
+    global _loaded
+    if _loaded:
+        return
+    with _lock:
+        while _pending is not None and not _loaded:
+            _load_done.wait()
+        if _loaded:
+            return
+        _reset_columns()
+        for business in loader():
+            _index(business)
+        _loaded = True
+
+
+def index_analysis(business: dict):
+    """Actualiza las columnas con un análisis nuevo o re-analizado."""
+    with _lock:
+        if _loaded:
+            _index(business)
+        elif _pending is not None:
+            _pending.append(business)
+
+
+def reset():
+    """Limpia las columnas (al borrar el historial)."""
+    global _loaded
+    with _lock:
+        _reset_columns()
+        _loaded = False
+
+
+def _labels(dimension: str) -> list:
+    """Etiquetas legibles de los códigos de una dimensión."""
+    if dimension == "category":
+        return _category_keys
+    if dimension == "business":
+        return _business_keys
+    if dimension == "sentiment":
+        return SENTIMENTS
+    if dimension == "bot_classification":
+        return BOT_CLASSES
+    return list(range(6))
+
+
+def query(group_by: list, measures: list, filters: dict, hist_bins: int = 10) -> dict:
+    """
+    Ejecuta una consulta agregada.
+
+    Args:
+        group_by: dimensiones por las que agrupar (ver DIMENSIONS)
+        measures: medidas a calcular (ver MEASURES)
+        filters: category, business, sentiment, bot_classification,
+                 min_rating, max_rating, since, until (epoch)
+        hist_bins: cantidad de tramos del histograma de confianza
+
+    Returns:
+        dict con la lista de grupos y el total de reseñas consideradas
+    """
+    for dimension in group_by:
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Dimensión desconocida: {dimension}")
+    for measure in measures:
+        if measure not in MEASURES:
+            raise ValueError(f"Medida desconocida: {measure}")
+
+    with _lock:
+        cols = {name: column[:_size] for name, column in _columns.items()}
+
+        # Filtros
+        mask = cols["alive"].copy()
+        if filters.get("category"):
+            mask &= cols["category"] == _category_codes.get(filters["category"], -1)
+        if filters.get("business"):
+            mask &= cols["business"] == _business_codes.get(filters["business"], -1)
+        if filters.get("sentiment"):
+            mask &= cols["sentiment"] == SENTIMENT_CODES.get(filters["sentiment"], -1)
+        if filters.get("bot_classification"):
+            mask &= cols["bot_classification"] == BOT_CODES.get(filters["bot_classification"], -1)
+        if filters.get("min_rating") is not None:
+            mask &= cols["rating"] >= filters["min_rating"]
+        if filters.get("max_rating") is not None:
+            mask &= cols["rating"] <= filters["max_rating"]
+        if filters.get("since") is not None:
+            mask &= cols["date"] >= filters["since"]
+        if filters.get("until") is not None:
+            mask &= cols["date"] <= filters["until"]
+
+        selected = {name: cols[name][mask] for name in cols if name != "alive"}
+        labels = {dimension: list(_labels(dimension)) for dimension in group_by}
+        business_names = list(_business_names)
+
+    # Clave de grupo combinada: un solo entero por reseña
+    sizes = [len(labels[d]) for d in group_by]
+    if group_by:
+        keys = np.ravel_multi_index([selected[d].astype(np.int64) for d in group_by], sizes)
+    else:
+        keys = np.zeros(len(selected["rating"]), dtype=np.int64)
+
+    # Numerar solo los grupos presentes (el producto de dimensiones puede ser enorme)
+    present, group_ids = np.unique(keys, return_inverse=True)
+    n_groups = len(present)
+    total = len(keys)
+    keys = group_ids
+
+    counts = np.bincount(keys, minlength=n_groups)
+    results = {}
+    if "mean_rating" in measures:
+        results["mean_rating"] = np.bincount(keys, weights=selected["rating"], minlength=n_groups)
+    if "mean_confidence" in measures:
+        results["mean_confidence"] = np.bincount(keys, weights=selected["confidence"], minlength=n_groups)
+    if "bot_share" in measures:
+        is_bot = selected["bot_classification"] == BOT_CODES["bot"]
+        results["bot_share"] = np.bincount(keys, weights=is_bot, minlength=n_groups)
+    if "suspicious_share" in measures:
+        is_suspicious = selected["bot_classification"] == BOT_CODES["suspicious"]
+        results["suspicious_share"] = np.bincount(keys, weights=is_suspicious, minlength=n_groups)
+    if "confidence_hist" in measures:
+        bins = np.clip((selected["confidence"] * hist_bins).astype(np.int64), 0, hist_bins - 1)
+        hist = np.bincount(keys * hist_bins + bins, minlength=n_groups * hist_bins)
+        results["confidence_hist"] = hist.reshape(n_groups, hist_bins)
+
+    # Armar la respuesta solo con los grupos presentes
+    coords = np.unravel_index(present, sizes) if group_by else []
+    groups = []
+    for i in range(n_groups):
+        group = {}
+        for j, dimension in enumerate(group_by):
+            code = int(coords[j][i])
+            group[dimension] = labels[dimension][code]
+            if dimension == "business":
+                group["business_name"] = business_names[code]
+        count = int(counts[i])
+        if "count" in measures:
+            group["count"] = count
+        for measure in ("mean_rating", "mean_confidence", "bot_share", "suspicious_share"):
+            if measure in results:
+                group[measure] = round(float(results[measure][i]) / count, 4)
+        if "confidence_hist" in results:
+            group["confidence_hist"] = results["confidence_hist"][i].tolist()
+        groups.append(group)
+
+    return {
+        "group_by": group_by,
+        "measures": measures,
+        "total": int(total),
+        "groups": groups,
+    }
@@ -0,0 +1,137 @@
+"""
+Notificaciones en vivo para los dashboards (Server-Sent Events).
+Cada análisis o limpieza del historial se publica una sola vez y se reparte
+a todos los clientes conectados. Cada cliente tiene una cola acotada: si no
+consume a tiempo, se descartan sus eventos pendientes y se le pide resincronizar.
+"""
+
+import asyncio
+import json
+
+from fastapi import Request
+
+# Eventos pendientes por cliente antes de considerarlo lento
+QUEUE_SIZE = 100
+
+# Cada cuántos segundos se envía un ping para mantener viva la conexión
+PING_SECONDS = 15
+
+# Campos del negocio que se envían (sin las reseñas)
+SUMMARY_FIELDS = [
+    "name", "url", "category", "total_reviews", "average_rating",
+    "sentiment_summary", "bot_stats", "analyzed_at", "updated_at", "place_id",
+]
+
+_subscribers = set()
+_stats = {"published": 0, "resyncs": 0}
+
+
+def _format(event_type: str, data: dict) -> str:
+    """Serializa un evento en formato SSE."""
+    return f"event: {event_type}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+_RESYNC = _format("resync", {})
+
+
+def publish(event_type: str, data: dict):
+    """Publica un evento a todos los clientes (se serializa una sola vez)."""
+    message = _format(event_type, data)
+    _stats["published"] += 1
+    for queue in list(_subscribers):
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Cliente lento: descartar lo pendiente y pedirle que resincronice
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(_RESYNC)
+            _stats["resyncs"] += 1
+
+
+def business_summary(business: dict) -> dict:
+    """Resumen compacto de un negocio para enviar en vivo."""
+    return {field: business.get(field) for field in SUMMARY_FIELDS if field in business}
+
+
+def _category_stats(business: dict, sign: int) -> dict:
+    """Aporte de un negocio a las estadísticas de su categoría (con signo)."""
+    sentiment = business.get("sentiment_summary", {})
+    bots = business.get("bot_stats", {})
+    return {
+        "total_businesses": sign,
+        "total_reviews": sign * business.get("total_reviews", 0),
+        "sentiment_totals": {k: sign * sentiment.get(k, 0) for k in ("positive", "neutral", "negative")},
+        "bot_totals": {k: sign * bots.get(k, 0) for k in ("real", "suspicious", "bot")},
+    }
+
+
+def stats_delta(business: dict, previous: dict = None) -> dict:
+    """
+    Cambios por categoría que produce un análisis (mismo formato que /stats).
+    Si reemplaza un análisis previo, se descuenta el aporte anterior.
+    """
+    deltas = {}
+    for item, sign in ((previous, -1), (business, 1)):
+        if not item:
+            continue
+        category = item.get("category", {})
+        cat_id = category.get("category_id", "otros")
+        change = _category_stats(item, sign)
+        if cat_id not in deltas:
+            deltas[cat_id] = {
+                "category_id": cat_id,
+                "category_name": category.get("category_name", "Otros"),
+                "icon": category.get("icon", "📍"),
+                **change,
+            }
+            continue
+        current = deltas[cat_id]
+        current["total_businesses"] += change["total_businesses"]
+        current["total_reviews"] += change["total_reviews"]
+        for group in ("sentiment_totals", "bot_totals"):
+            for key, value in change[group].items():
+                current[group][key] += value
+    return deltas
+
+
+def publish_analysis(business: dict, previous: dict = None):
+    """Publica un análisis nuevo junto con el cambio en las estadísticas."""
+    publish("analysis", {
+        "business": business_summary(business),
+        "stats_delta": stats_delta(business, previous),
+    })
+
+
+def publish_clear():
+    """Publica que el historial se limpió."""
+    publish("clear", {})
+
+
+async def stream(request: Request):
+    """Generador SSE para un cliente conectado."""
+    queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    _subscribers.add(queue)
+    try:
+        # Indicar al navegador cada cuánto reconectar
+        yield "retry: 5000\n\n"
+        while True:
+            if await request.is_disconnected():
+                break
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout=PING_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            yield message
+    finally:
+        _subscribers.discard(queue)
+
+
+def get_stats() -> dict:
+    """Estadísticas del canal de eventos."""
+    return {
+        "subscribers": len(_subscribers),
+        "published": _stats["published"],
+        "resyncs": _stats["resyncs"],
+    }
@@ -0,0 +1,136 @@
+"""
+Exportación del historial en NDJSON o CSV.
+Todo se genera por partes a partir de un iterador de análisis,
+así la memoria no crece con el tamaño del historial.
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+
+FORMATS = {
+    # formato: (media type, extensión)
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+    "reviews_csv": ("text/csv", "csv"),
+}
+
+# Columnas del CSV por negocio
+BUSINESS_COLUMNS = [
+    "name", "url", "category_id", "category_name", "analyzed_at",
+    "total_reviews", "average_rating", "positive", "neutral", "negative",
+    "real", "suspicious", "bot",
+]
+
+# Columnas del CSV por reseña: las primeras son las de reviews_google_maps.csv
+REVIEW_COLUMNS = [
+    "username", "rating", "review_text", "source", "scraping_date",
+    "business_name", "url", "category_id", "sentiment", "confidence",
+    "bot_score", "bot_classification", "bot_indicators",
+]
+
+# Filas acumuladas antes de emitir un bloque de CSV
+ROWS_PER_CHUNK = 500
+
+
+def _scraping_date(analyzed_at: str) -> str:
+    """Fecha en el formato de reviews_google_maps.csv (YYYY-MM-DD HH:MM:SS)."""
+    try:
+        return datetime.fromisoformat(analyzed_at).strftime("%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError):
+        return ""
+
+
+def _business_row(business: dict) -> list:
+    """Fila del CSV por negocio."""
+    category = business.get("category", {})
+    sentiment = business.get("sentiment_summary", {})
+    bots = business.get("bot_stats", {})
+    return [
+        business.get("name", ""),
+        business.get("url", ""),
+        category.get("category_id", ""),
+        category.get("category_name", ""),
+        business.get("analyzed_at", ""),
+        business.get("total_reviews", 0),
+        business.get("average_rating", 0),
+        sentiment.get("positive", 0),
+        sentiment.get("neutral", 0),
+        sentiment.get("negative", 0),
+        bots.get("real", 0),
+        bots.get("suspicious", 0),
+        bots.get("bot", 0),
+    ]
+
+
+def _review_rows(business: dict):
+    """Filas del CSV por reseña de un negocio."""
+    scraping_date = _scraping_date(business.get("analyzed_at"))
+    category_id = business.get("category", {}).get("category_id", "")
+    for review in business.get("reviews", []):
+        yield [
+            review.get("author", ""),
+            review.get("rating", ""),
+            review.get("text", ""),
+            "Google Maps",
+            scraping_date,
+            business.get("name", ""),
+            business.get("url", ""),
+            category_id,
+            review.get("sentiment", ""),
+            review.get("confidence", ""),
+            review.get("bot_score", ""),
+            review.get("bot_classification", ""),
+            "|".join(review.get("bot_indicators", [])),
+        ]
+
+
+def _csv_chunks(header: list, rows):
+    """Convierte filas en bloques de texto CSV."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count >= ROWS_PER_CHUNK:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            count = 0
+    yield buffer.getvalue()
+
+
+def _ndjson_chunks(analyses):
+    """Un negocio completo por línea."""
+    for business in analyses:
+        yield json.dumps(business, ensure_ascii=False) + "\n"
+
+
+def export_chunks(analyses, fmt: str):
+    """Genera el contenido exportado en bloques de texto."""
+    if fmt == "ndjson":
+        return _ndjson_chunks(analyses)
+    if fmt == "csv":
+        return _csv_chunks(BUSINESS_COLUMNS, (_business_row(b) for b in analyses))
+    if fmt == "reviews_csv":
+        return _csv_chunks(REVIEW_COLUMNS, (row for b in analyses for row in _review_rows(b)))
+    raise ValueError(f"Formato desconocido: {fmt}")
+
+
+def encode(chunks, compress: bool = False):
+    """Codifica los bloques en UTF-8 y, opcionalmente, los comprime con gzip."""
+    if not compress:
+        for chunk in chunks:
+            yield chunk.encode("utf-8")
+        return
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 = formato gzip
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
@@ -1,58 +1,101 @@
 """
 Configuración de Firebase/Firestore.
 Soporta tanto credenciales locales (archivo JSON) como variables de entorno (para Render).
+firebase_admin se importa recién al inicializar, para no demorar el arranque.
 """
 
 import os
 import json
-import firebase_admin
-from firebase_admin import credentials, firestore
+import threading
+import time
+
+# Archivo local de credenciales (desarrollo)
+CREDENTIALS_FILE = os.path.join(os.path.dirname(__file__), 'firebase-credentials.json')
+
+# Espera antes de reintentar tras un fallo (se duplica hasta el máximo)
+RETRY_BACKOFF = 30.0
+MAX_RETRY_BACKOFF = 600.0
 
 # Variable global para el cliente de Firestore
 _db = None
+_lock = threading.Lock()
+
+# Caché del último fallo: no reintentar hasta _retry_at
+_retry_at = 0.0
+_backoff = RETRY_BACKOFF
+
+
+def has_credentials() -> bool:
+    """Indica si hay credenciales configuradas (sin importar firebase_admin)."""
+    return bool(os.environ.get('FIREBASE_CREDENTIALS_JSON')) or os.path.exists(CREDENTIALS_FILE)
+
+
+def _mark_failure():
+    """Registra un fallo y programa el próximo reintento."""
+    global _retry_at, _backoff
+    _retry_at = time.monotonic() + _backoff
+    print(f"   Se reintentará en {int(_backoff)}s")
+    _backoff = min(_backoff * 2, MAX_RETRY_BACKOFF)
 
 
 def get_firestore_client():
     """
     Obtiene el cliente de Firestore, inicializándolo si es necesario.
-    
+
     Soporta dos modos:
     1. Variable de entorno FIREBASE_CREDENTIALS_JSON (para Render/producción)
     2. Archivo local firebase-credentials.json (para desarrollo)
+
+    Si la inicialización falla, retorna None sin reintentar hasta que pase el backoff.
     """
-    global _db
-    
+    global _db, _backoff
+
     if _db is not None:
         return _db
-    
-    try:
-        # Opción 1: Credenciales desde variable de entorno (Render)
-        creds_json = os.environ.get('FIREBASE_CREDENTIALS_JSON')
-        
-        if creds_json:
-            creds_dict = json.loads(creds_json)
-            cred = credentials.Certificate(creds_dict)
-        else:
-            # Opción 2: Archivo local (desarrollo)
-            creds_path = os.path.join(os.path.dirname(__file__), 'firebase-credentials.json')
-            
-            if os.path.exists(creds_path):
-                cred = credentials.Certificate(creds_path)
+
+    if time.monotonic() < _retry_at:
+        return None
+
+    with _lock:
+        if _db is not None:
+            return _db
+        if time.monotonic() < _retry_at:
+            return None
+
+        try:
+            import firebase_admin
+            from firebase_admin import credentials, firestore
+
+            # Opción 1: Credenciales desde variable de entorno (Render)
+            creds_json = os.environ.get('FIREBASE_CREDENTIALS_JSON')
+
+            if creds_json:
+                creds_dict = json.loads(creds_json)
+                cred = credentials.Certificate(creds_dict)
+            elif os.path.exists(CREDENTIALS_FILE):
+                # Opción 2: Archivo local (desarrollo)
+                cred = credentials.Certificate(CREDENTIALS_FILE)
             else:
                 print("⚠️ No se encontraron credenciales de Firebase.")
                 print("   Para desarrollo: coloca firebase-credentials.json en backend/")
                 print("   Para producción: configura FIREBASE_CREDENTIALS_JSON")
+                _mark_failure()
                 return None
-        
-        # Inicializar Firebase
-        firebase_admin.initialize_app(cred)
-        _db = firestore.client()
-        print("✅ Firestore conectado exitosamente")
-        return _db
-        
-    except Exception as e:
-        print(f"❌ Error conectando a Firestore: {e}")
-        return None
+
+            # Inicializar Firebase (si un intento anterior ya creó la app, reutilizarla)
+            try:
+                firebase_admin.get_app()
+            except ValueError:
+                firebase_admin.initialize_app(cred)
+            _db = firestore.client()
+            _backoff = RETRY_BACKOFF
+            print("✅ Firestore conectado exitosamente")
+            return _db
+
+        except Exception as e:
+            print(f"❌ Error conectando a Firestore: {e}")
+            _mark_failure()
+            return None
 
 
 def is_firestore_available():
@@ -0,0 +1,256 @@
+"""
+Espejo en memoria de la colección de Firestore.
+Carga la colección una vez y la mantiene al día con un listener on_snapshot,
+así las lecturas se sirven localmente sin ir a la red (ni pagar por lectura).
+Mantiene índices por URL y por categoría. Si las reseñas superan el límite de
+memoria, se descartan las de los negocios menos usados y se leen de Firestore
+cuando se piden. Si el listener se cae, history_firestore vuelve a leer directo;
+al reiniciarlo, el espejo se reconstruye con la primera respuesta (así no quedan
+documentos borrados mientras estuvo caído).
+
+Se activa con FIRESTORE_MIRROR=1 (límite de reseñas: FIRESTORE_MIRROR_MAX_MB).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+# Documentos por lectura en lote al recuperar reseñas descartadas
+FETCH_BATCH = 100
+
+
+def _reviews_size(business: dict) -> int:
+    """Tamaño aproximado en bytes de las reseñas de un negocio."""
+    return sum(len(r.get("text", "")) + 200 for r in business.get("reviews", []))
+
+
+class FirestoreMirror:
+    """Réplica local de una colección, actualizada por on_snapshot."""
+
+    def __init__(self, collection, client, max_review_bytes: int = 256 * 1024 * 1024,
+                 restart_backoff: float = 30.0):
+        self._collection = collection
+        # Cliente de Firestore, para leer en lote (client.get_all)
+        self._client = client
+        self._max_review_bytes = max_review_bytes
+        self._restart_backoff = restart_backoff
+
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._watch = None
+        self._last_start = 0.0
+        # Cada start() abre una generación; los avisos de listeners viejos se ignoran
+        self._generation = 0
+        self._resync = False
+
+        # doc_id -> documento; el orden indica uso reciente (para descartar reseñas)
+        self._docs = OrderedDict()
+        self._evicted = set()
+        self._review_bytes = 0
+        self._by_url = {}
+        self._by_category = {}
+
+    # ============== Listener ==============
+
+    def start(self):
+        """
+        Se suscribe a la colección. La primera respuesta trae todos los documentos
+        y reemplaza el contenido del espejo.
+        """
+        self._last_start = time.monotonic()
+        self._ready.clear()
+        if self._watch is not None:
+            try:
+                self._watch.unsubscribe()
+            except Exception:
+                pass
+        with self._lock:
+            self._generation += 1
+            self._resync = True
+            generation = self._generation
+        self._watch = self._collection.on_snapshot(
+            lambda docs, changes, read_time: self._on_snapshot(docs, changes, read_time, generation)
+        )
+
+    def stop(self):
+        """Cancela el listener."""
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+        self._ready.clear()
+
+    def _on_snapshot(self, docs, changes, read_time, generation: int = None):
+        """Aplica los cambios que envía Firestore (la primera vez, la colección completa)."""
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            if self._resync:
+                self._reset()
+                for doc in docs:
+                    self._put(doc.id, doc.to_dict())
+                self._resync = False
+                changes = []
+            for change in changes:
+                doc = change.document
+                if change.type.name == "REMOVED":
+                    self._remove(doc.id)
+                else:
+                    self._put(doc.id, doc.to_dict())
+        self._ready.set()
+
+    def is_active(self) -> bool:
+        """
+        Indica si el espejo está al día y se puede leer de él.
+        Si el listener se cayó, lo reinicia (con backoff) y retorna False mientras tanto.
+        """
+        watch_active = self._watch is not None and getattr(self._watch, "is_active", True)
+        if self._ready.is_set() and watch_active:
+            return True
+
+        if not watch_active and time.monotonic() - self._last_start > self._restart_backoff:
+            print("🔁 Reiniciando espejo de Firestore")
+            try:
+                self.start()
+            except Exception as e:
+                print(f"❌ No se pudo reiniciar el espejo: {e}")
+        return False
+
+    # ============== Índices (llamar con lock) ==============
+
+    def _reset(self):
+        self._docs.clear()
+        self._evicted.clear()
+        self._review_bytes = 0
+        self._by_url.clear()
+        self._by_category.clear()
+
+    def _remove(self, doc_id: str):
+        old = self._docs.pop(doc_id, None)
+        if old is None:
+            return
+        if doc_id in self._evicted:
+            self._evicted.discard(doc_id)
+        else:
+            self._review_bytes -= _reviews_size(old)
+        self._by_url.pop(old.get("url"), None)
+        category_id = old.get("category", {}).get("category_id", "otros")
+        self._by_category.get(category_id, set()).discard(doc_id)
+
+    def _put(self, doc_id: str, business: dict):
+        self._remove(doc_id)
+        self._docs[doc_id] = business
+        self._review_bytes += _reviews_size(business)
+        self._by_url[business.get("url")] = doc_id
+        category_id = business.get("category", {}).get("category_id", "otros")
+        self._by_category.setdefault(category_id, set()).add(doc_id)
+        self._evict()
+
+    def _evict(self):
+        """Descarta reseñas de los negocios menos usados hasta respetar el límite."""
+        for doc_id in list(self._docs):
+            if self._review_bytes <= self._max_review_bytes:
+                return
+            if doc_id in self._evicted:
+                continue
+            business = self._docs[doc_id]
+            self._review_bytes -= _reviews_size(business)
+            self._docs[doc_id] = {k: v for k, v in business.items() if k != "reviews"}
+            self._evicted.add(doc_id)
+
+    # ============== Lecturas ==============
+
+    def upsert(self, doc_id: str, business: dict):
+        """Aplica una escritura propia sin esperar al listener."""
+        with self._lock:
+            self._put(doc_id, dict(business))
+
+    def delete(self, doc_id: str):
+        """Aplica una eliminación propia sin esperar al listener."""
+        with self._lock:
+            self._remove(doc_id)
+
+    def _full(self, doc_id: str) -> Optional[dict]:
+        """
+        Documento completo; si sus reseñas se descartaron, lo lee de Firestore
+        y las vuelve a guardar en el espejo.
+        """
+        with self._lock:
+            business = self._docs.get(doc_id)
+            if business is None:
+                return None
+            self._docs.move_to_end(doc_id)
+            if doc_id not in self._evicted:
+                return business
+
+        doc = self._collection.document(doc_id).get()
+        if not doc.exists:
+            return None
+        full = doc.to_dict()
+        with self._lock:
+            if doc_id in self._docs:
+                self._put(doc_id, full)
+        return full
+
+    def _fetch(self, doc_ids: list) -> dict:
+        """Lee varios documentos de Firestore en lotes (una llamada por lote)."""
+        found = {}
+        for start in range(0, len(doc_ids), FETCH_BATCH):
+            refs = [self._collection.document(d) for d in doc_ids[start:start + FETCH_BATCH]]
+            for doc in self._client.get_all(refs):
+                if doc.exists:
+                    found[doc.id] = doc.to_dict()
+        return found
+
+    def _full_many(self, doc_ids: list) -> list:
+        """
+        Documentos completos; los que tienen reseñas descartadas se leen juntos
+        en lote y no se vuelven a guardar (recorrer todo no debe desplazar a los más usados).
+        """
+        with self._lock:
+            docs = [(d, self._docs.get(d)) for d in doc_ids]
+            evicted = [d for d, b in docs if b is not None and d in self._evicted]
+        fetched = self._fetch(evicted) if evicted else {}
+        evicted = set(evicted)
+        result = []
+        for doc_id, business in docs:
+            if business is None:
+                continue
+            if doc_id not in evicted:
+                result.append(business)
+            elif doc_id in fetched:
+                result.append(fetched[doc_id])
+        return result
+
+    def get_by_url(self, url: str) -> Optional[dict]:
+        """Análisis por URL."""
+        doc_id = self._by_url.get(url)
+        return self._full(doc_id) if doc_id else None
+
+    def get_all(self) -> list:
+        """Todos los análisis (completos)."""
+        with self._lock:
+            doc_ids = list(self._docs)
+        return self._full_many(doc_ids)
+
+    def get_by_category(self, category_id: str) -> list:
+        """Análisis de una categoría (completos)."""
+        with self._lock:
+            doc_ids = list(self._by_category.get(category_id, ()))
+        return self._full_many(doc_ids)
+
+    def summaries(self) -> list:
+        """Todos los análisis, sin garantizar las reseñas (para estadísticas)."""
+        with self._lock:
+            return list(self._docs.values())
+
+    def status(self) -> dict:
+        """Estado del espejo."""
+        with self._lock:
+            return {
+                "active": self._ready.is_set(),
+                "documents": len(self._docs),
+                "evicted_reviews": len(self._evicted),
+                "review_bytes": self._review_bytes,
+            }
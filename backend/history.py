@@ -3,14 +3,38 @@ Gestión de historial de análisis.
 Almacena y recupera análisis previos en archivo JSON.
 """
 
+import bisect
+import hashlib
 import json
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Optional
 
+import sketches
+
 # Ruta del archivo de historial
 HISTORY_FILE = os.path.join(os.path.dirname(__file__), "analysis_history.json")
 
+# Máximo de cambios por respuesta de get_changes
+CHANGES_LIMIT = 500
+
+# Tamaño de lectura al recorrer el archivo de a poco
+READ_CHUNK = 64 * 1024
+
+
+def _next_updated_at(history: dict) -> str:
+    """
+    Timestamp para updated_at, siempre mayor que el último guardado
+    (los negocios se mantienen ordenados por updated_at).
+    """
+    now = datetime.now()
+    last = history.get("last_change")
+    if last and now <= datetime.fromisoformat(last):
+        now = datetime.fromisoformat(last) + timedelta(microseconds=1)
+    stamp = now.isoformat(timespec="microseconds")
+    history["last_change"] = stamp
+    return stamp
+
 
 def load_history() -> dict:
     """Carga el historial desde el archivo JSON."""
@@ -25,11 +49,17 @@ def load_history() -> dict:
 
 
 def save_history(history: dict) -> bool:
-    """Guarda el historial en el archivo JSON."""
+    """
+    Guarda el historial en el archivo JSON.
+    Escribe un archivo temporal y lo reemplaza de una vez, así quien lo esté
+    leyendo (por ejemplo, un export en curso) nunca ve un archivo a medio escribir.
+    """
     try:
         history["last_updated"] = datetime.now().isoformat()
-        with open(HISTORY_FILE, "w", encoding="utf-8") as f:
+        tmp_file = HISTORY_FILE + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
             json.dump(history, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, HISTORY_FILE)
         return True
     except IOError:
         return False
@@ -42,6 +72,9 @@ def add_analysis(business_data: dict) -> dict:
     """
     history = load_history()
     
+    # ID del negocio (igual que el _id de Firestore y el de su serie en trends.py)
+    business_data["place_id"] = hashlib.md5(business_data.get("url", "").encode()).hexdigest()[:16]
+    
     # Buscar si ya existe
     existing_index = None
     for i, b in enumerate(history["businesses"]):
@@ -49,26 +82,169 @@ def add_analysis(business_data: dict) -> dict:
             existing_index = i
             break
     
-    # Agregar timestamp
+    # Agregar timestamps
     business_data["analyzed_at"] = datetime.now().isoformat()
+    business_data["updated_at"] = _next_updated_at(history)
     
+    previous = None
     if existing_index is not None:
-        # Actualizar existente
-        history["businesses"][existing_index] = business_data
-    else:
-        # Agregar nuevo
-        history["businesses"].append(business_data)
+        # Actualizar existente: se mueve al final para mantener el orden por updated_at
+        previous = history["businesses"].pop(existing_index)
+    history["businesses"].append(business_data)
+    
+    # Sketches del negocio y de su rubro
+    business_data["sketches"] = sketches.from_reviews(business_data.get("reviews", []))
+    _update_category_sketches(history, business_data, previous)
+    
+    # Si había sido eliminado antes, ya no lo está
+    history["deleted"] = [
+        d for d in history.get("deleted", []) if d.get("url") != business_data.get("url")
+    ]
     
     save_history(history)
     return business_data
 
 
+def _category_id(business: dict) -> str:
+    return business.get("category", {}).get("category_id", "otros")
+
+
+def _rebuild_category_sketch(history: dict, category_id: str) -> dict:
+    """Recalcula el sketch de un rubro combinando los de sus negocios."""
+    return sketches.merge([
+        sketches.of_business(b) for b in history.get("businesses", [])
+        if _category_id(b) == category_id
+    ])
+
+
+def _update_category_sketches(history: dict, business: dict, previous: Optional[dict]):
+    """Actualiza los sketches por rubro (recalcula si no se puede de forma incremental)."""
+    category_sketches = history.setdefault("category_sketches", {})
+    category_id = _category_id(business)
+    
+    updated = None
+    if category_id in category_sketches:
+        updated = sketches.category_update(category_sketches[category_id], business, previous)
+    category_sketches[category_id] = updated or _rebuild_category_sketch(history, category_id)
+    
+    # Si el negocio cambió de rubro, el anterior pierde sus reseñas
+    if previous is not None and _category_id(previous) != category_id:
+        category_sketches[_category_id(previous)] = _rebuild_category_sketch(
+            history, _category_id(previous)
+        )
+
+
+def _category_sketches(history: dict) -> dict:
+    """Sketches serializados por rubro de un historial ya cargado."""
+    category_sketches = history.get("category_sketches", {})
+    # Historiales anteriores a los sketches: calcularlos al vuelo
+    for category_id in {_category_id(b) for b in history.get("businesses", [])}:
+        if category_id not in category_sketches:
+            category_sketches[category_id] = _rebuild_category_sketch(history, category_id)
+    return category_sketches
+
+
+def get_category_sketches() -> dict:
+    """Sketches serializados por rubro."""
+    return _category_sketches(load_history())
+
+
 def get_all_analyses() -> list:
     """Obtiene todos los análisis del historial."""
     history = load_history()
     return history.get("businesses", [])
 
 
+def get_analysis_by_url(url: str) -> Optional[dict]:
+    """Obtiene un análisis específico por URL."""
+    for b in get_all_analyses():
+        if b.get("url") == url:
+            return b
+    return None
+
+
+def iter_analyses(category_id: Optional[str] = None, since: Optional[str] = None,
+                  until: Optional[str] = None):
+    """
+    Recorre los análisis de a uno leyendo el archivo por partes,
+    sin cargar todo el historial en memoria.
+    Filtra por categoría y por analyzed_at (since/until en formato ISO, until inclusivo).
+    """
+    for business in _stream_businesses():
+        if category_id and business.get("category", {}).get("category_id") != category_id:
+            continue
+        analyzed_at = business.get("analyzed_at") or ""
+        if since and analyzed_at < since:
+            continue
+        if until and analyzed_at[:len(until)] > until:
+            continue
+        yield business
+
+
+def _stream_businesses():
+    """
+    Lee los negocios del archivo JSON uno por uno.
+    Un archivo dañado lanza JSONDecodeError (no se corta en silencio).
+    """
+    if not os.path.exists(HISTORY_FILE):
+        return
+    
+    decoder = json.JSONDecoder()
+    with open(HISTORY_FILE, "r", encoding="utf-8") as f:
+        buffer = ""
+        pos = 0
+        eof = False
+        
+        def fill():
+            """Descarta lo ya leído y agrega otra parte del archivo."""
+            nonlocal buffer, pos, eof
+            chunk = f.read(READ_CHUNK)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+        
+        def skip(chars: str):
+            """Avanza sobre espacios y los caracteres indicados."""
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] in chars):
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    return
+                fill()
+        
+        def decode():
+            """Decodifica el siguiente valor JSON, leyendo más si está incompleto."""
+            nonlocal pos
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                    # Un número al final del buffer podría seguir en la próxima parte
+                    if end < len(buffer) or eof:
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                fill()
+        
+        fill()
+        skip("{")
+        while pos < len(buffer):
+            key = decode()
+            skip(":")
+            if key != "businesses":
+                decode()
+                skip(",")
+                continue
+            
+            skip("[")
+            while pos < len(buffer) and buffer[pos] != "]":
+                yield decode()
+                skip(",")
+            return
+
+
 def get_analyses_by_category(category_id: str) -> list:
     """Obtiene análisis filtrados por categoría."""
     all_analyses = get_all_analyses()
@@ -82,7 +258,9 @@ def get_category_stats() -> dict:
     """
     Obtiene estadísticas agregadas por categoría.
     """
-    all_analyses = get_all_analyses()
+    history = load_history()
+    all_analyses = history.get("businesses", [])
+    category_sketches = _category_sketches(history)
     
     stats = {}
     for business in all_analyses:
@@ -98,7 +276,8 @@ def get_category_stats() -> dict:
                 "total_businesses": 0,
                 "total_reviews": 0,
                 "sentiment_totals": {"positive": 0, "neutral": 0, "negative": 0},
-                "bot_totals": {"real": 0, "suspicious": 0, "bot": 0}
+                "bot_totals": {"real": 0, "suspicious": 0, "bot": 0},
+                "sketches": sketches.summarize(category_sketches.get(cat_id))
             }
         
         stats[cat_id]["total_businesses"] += 1
@@ -117,10 +296,78 @@ def get_category_stats() -> dict:
     return stats
 
 
+def delete_analysis(url: str) -> bool:
+    """Elimina un análisis por URL (queda registrado para get_changes)."""
+    history = load_history()
+    remaining = [b for b in history["businesses"] if b.get("url") != url]
+    if len(remaining) == len(history["businesses"]):
+        return False
+    
+    removed = next(b for b in history["businesses"] if b.get("url") == url)
+    history["businesses"] = remaining
+    category_id = _category_id(removed)
+    if category_id in history.get("category_sketches", {}):
+        history["category_sketches"][category_id] = _rebuild_category_sketch(history, category_id)
+    deleted = [d for d in history.get("deleted", []) if d.get("url") != url]
+    deleted.append({"url": url, "updated_at": _next_updated_at(history)})
+    history["deleted"] = deleted
+    return save_history(history)
+
+
+def get_changes(since: Optional[str] = None, limit: int = CHANGES_LIMIT) -> dict:
+    """
+    Obtiene los negocios agregados, actualizados o eliminados después del cursor.
+    El cursor es el updated_at del último cambio entregado.
+    Si el historial se limpió después del cursor, retorna reset=True.
+    """
+    history = load_history()
+    businesses = history.get("businesses", [])
+    deleted = history.get("deleted", [])
+    cleared_at = history.get("cleared_at")
+    
+    reset = not since or (cleared_at is not None and since < cleared_at)
+    if reset:
+        since = ""
+    
+    if reset:
+        # Sincronización completa (los análisis antiguos pueden no tener updated_at)
+        changed = businesses
+        has_more = False
+    else:
+        # Los negocios están ordenados por updated_at (los antiguos sin él van primero)
+        stamps = [b.get("updated_at", "") for b in businesses]
+        start = bisect.bisect_right(stamps, since)
+        changed = businesses[start:start + limit]
+        has_more = start + limit < len(businesses)
+    
+    cursor = max([since, cleared_at or ""] + [b.get("updated_at", "") for b in changed])
+    
+    # Eliminaciones después del cursor anterior; si quedan más páginas,
+    # solo las que no pasan al nuevo cursor
+    removed = []
+    if not reset:
+        for d in deleted:
+            if since < d["updated_at"] and (not has_more or d["updated_at"] <= cursor):
+                removed.append(d["url"])
+                cursor = max(cursor, d["updated_at"])
+    
+    return {
+        "businesses": changed,
+        "deleted": removed,
+        "cursor": cursor,
+        "reset": reset,
+        "has_more": has_more
+    }
+
+
 def clear_history() -> bool:
     """Limpia todo el historial."""
     try:
-        save_history({"businesses": [], "last_updated": None})
+        history = load_history()
+        cleared = {"businesses": [], "last_updated": None, "deleted": []}
+        cleared["cleared_at"] = _next_updated_at(history)
+        cleared["last_change"] = history["last_change"]
+        save_history(cleared)
         return True
     except:
         return False
@@ -3,21 +3,126 @@ Gestión de historial usando Firebase Firestore.
 Reemplaza el almacenamiento en JSON local.
 """
 
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Optional
 import hashlib
+import itertools
+import os
+import threading
 
+import sketches
 from firebase_config import get_firestore_client, is_firestore_available
+from firestore_mirror import FirestoreMirror
 
 # Colección principal
 COLLECTION_NAME = "businesses"
 
+# Registro de eliminaciones y metadatos (para get_changes)
+DELETIONS_COLLECTION = "deletions"
+META_COLLECTION = "meta"
+META_DOC = "history"
+
+# Sketches por rubro: {"sketch": ..., "stale": bool, "version": int}
+SKETCHES_COLLECTION = "category_sketches"
+
+# Series de tiempo de trends.py: registros binarios en bloques por negocio
+# (trends/{place_id}/chunks/{n}), así sobreviven a reinicios de la instancia
+TRENDS_COLLECTION = "trends"
+TRENDS_CHUNKS = "chunks"
+# Bytes por bloque (muy por debajo del límite de 1 MiB por documento)
+TREND_CHUNK_BYTES = 256 * 1024
+
+# Máximo de cambios por respuesta de get_changes
+CHANGES_LIMIT = 500
+
+# Documentos por página al recorrer la colección
+PAGE_SIZE = 100
+
+# Espejo en memoria (opcional): FIRESTORE_MIRROR=1
+MIRROR_ENABLED = os.environ.get("FIRESTORE_MIRROR", "0") == "1"
+MIRROR_MAX_MB = float(os.environ.get("FIRESTORE_MIRROR_MAX_MB", "256"))
+
+_mirror = None
+_mirror_lock = threading.Lock()
+
+
+def start_mirror() -> Optional[FirestoreMirror]:
+    """Inicia el espejo en memoria (una sola vez) si está habilitado."""
+    global _mirror
+    
+    if not MIRROR_ENABLED or _mirror is not None:
+        return _mirror
+    
+    db = get_firestore_client()
+    if db is None:
+        return None
+    
+    with _mirror_lock:
+        if _mirror is None:
+            mirror = FirestoreMirror(
+                db.collection(COLLECTION_NAME),
+                db,
+                max_review_bytes=int(MIRROR_MAX_MB * 1024 * 1024)
+            )
+            try:
+                mirror.start()
+            except Exception as e:
+                print(f"❌ No se pudo iniciar el espejo de Firestore: {e}")
+                return None
+            _mirror = mirror
+            print("🪞 Espejo de Firestore iniciado")
+    return _mirror
+
+
+def _active_mirror() -> Optional[FirestoreMirror]:
+    """Retorna el espejo si está al día; None para leer directo de Firestore."""
+    mirror = start_mirror()
+    return mirror if mirror is not None and mirror.is_active() else None
+
+
+def get_mirror_status() -> Optional[dict]:
+    """Estado del espejo (None si no está habilitado o no arrancó)."""
+    return _mirror.status() if _mirror is not None else None
+
 
 def _generate_id(url: str) -> str:
     """Genera un ID único basado en la URL."""
     return hashlib.md5(url.encode()).hexdigest()[:16]
 
 
+def _next_updated_at(last: Optional[str]) -> str:
+    """Timestamp para updated_at, siempre mayor que el último asignado."""
+    now = datetime.now()
+    if last and now <= datetime.fromisoformat(last):
+        now = datetime.fromisoformat(last) + timedelta(microseconds=1)
+    return now.isoformat(timespec="microseconds")
+
+
+def _write_change(db, write) -> str:
+    """
+    Asigna el updated_at de un cambio y lo escribe en la misma transacción.
+    El último valor se guarda en meta/history: como todas las escrituras pasan
+    por ese documento, Firestore las serializa y cada cambio queda visible antes
+    de que otro reciba un updated_at mayor (aunque haya varias instancias o sus
+    relojes no coincidan). Así get_changes no pierde cambios al avanzar el cursor.
+    `write(transaction, stamp)` puede repetirse si la transacción se reintenta;
+    si retorna un dict, esos campos se guardan también en meta/history.
+    """
+    from firebase_admin import firestore
+    
+    meta_ref = db.collection(META_COLLECTION).document(META_DOC)
+    
+    @firestore.transactional
+    def run(transaction):
+        meta = meta_ref.get(transaction=transaction)
+        stamp = _next_updated_at(meta.to_dict().get("last_change") if meta.exists else None)
+        meta_fields = write(transaction, stamp) or {}
+        transaction.set(meta_ref, {"last_change": stamp, **meta_fields}, merge=True)
+        return stamp
+    
+    return run(db.transaction())
+
+
 def add_analysis(business_data: dict) -> dict:
     """
     Agrega un nuevo análisis al historial en Firestore.
@@ -25,27 +130,229 @@ def add_analysis(business_data: dict) -> dict:
     """
     db = get_firestore_client()
     
+    # Generar ID único basado en URL (también es el ID de su serie en trends.py)
+    doc_id = _generate_id(business_data.get("url", ""))
+    business_data["place_id"] = doc_id
+    
     if db is None:
         # Fallback: retornar datos sin guardar
         business_data["_saved"] = False
         return business_data
     
-    # Generar ID único basado en URL
-    doc_id = _generate_id(business_data.get("url", ""))
+    # Análisis anterior (para actualizar los sketches del rubro)
+    mirror = _active_mirror()
+    if mirror is not None:
+        previous = mirror.get_by_url(business_data.get("url", ""))
+    else:
+        snapshot = db.collection(COLLECTION_NAME).document(doc_id).get()
+        previous = snapshot.to_dict() if snapshot.exists else None
+    business_data["sketches"] = sketches.from_reviews(business_data.get("reviews", []))
     
-    # Agregar timestamp
+    # Agregar timestamps
     business_data["analyzed_at"] = datetime.now().isoformat()
     business_data["_id"] = doc_id
     
-    # Guardar en Firestore
-    db.collection(COLLECTION_NAME).document(doc_id).set(business_data)
+    # Guardar en Firestore (y quitar la marca de eliminado si la tenía)
+    def save(transaction, stamp):
+        business_data["updated_at"] = stamp
+        transaction.set(db.collection(COLLECTION_NAME).document(doc_id), business_data)
+        transaction.delete(db.collection(DELETIONS_COLLECTION).document(doc_id))
+    
+    _write_change(db, save)
     business_data["_saved"] = True
+    _update_category_sketches(db, business_data, previous)
+    
+    # Reflejar la escritura en el espejo sin esperar al listener
+    if _mirror is not None:
+        _mirror.upsert(doc_id, business_data)
     
     return business_data
 
 
+def _category_id(business: dict) -> str:
+    return business.get("category", {}).get("category_id", "otros")
+
+
+def _update_category_sketches(db, business: dict, previous: Optional[dict]):
+    """
+    Suma el análisis al sketch de su rubro dentro de una transacción.
+    Si no se puede de forma incremental, el rubro queda marcado para recalcular.
+    """
+    from firebase_admin import firestore
+    
+    category_id = _category_id(business)
+    ref = db.collection(SKETCHES_COLLECTION).document(category_id)
+    
+    @firestore.transactional
+    def update(transaction):
+        snapshot = ref.get(transaction=transaction)
+        current = snapshot.to_dict() if snapshot.exists else {"stale": True}
+        updated = None
+        if not current.get("stale"):
+            updated = sketches.category_update(current.get("sketch"), business, previous)
+        transaction.set(ref, {
+            "sketch": updated or current.get("sketch"),
+            "stale": updated is None,
+            "version": current.get("version", 0) + 1
+        })
+    
+    update(db.transaction())
+    
+    # Si el negocio cambió de rubro, el anterior debe recalcularse
+    if previous is not None and _category_id(previous) != category_id:
+        _mark_stale(db, _category_id(previous))
+
+
+def _mark_stale(db, category_id: str):
+    """Marca el sketch de un rubro para recalcularlo en la próxima consulta."""
+    from firebase_admin import firestore
+    
+    db.collection(SKETCHES_COLLECTION).document(category_id).set(
+        {"stale": True, "version": firestore.Increment(1)}, merge=True
+    )
+
+
+def _read_category_sketches(db) -> tuple:
+    """Lee los sketches por rubro: (vigentes, versión de los marcados para recalcular)."""
+    current = {}
+    stale = {}
+    for doc in db.collection(SKETCHES_COLLECTION).stream():
+        data = doc.to_dict()
+        if data.get("stale") or not data.get("sketch"):
+            stale[doc.id] = data.get("version", 0)
+        else:
+            current[doc.id] = data["sketch"]
+    return current, stale
+
+
+def _rebuild_category_sketch(db, category_id: str, businesses: list, version: int) -> dict:
+    """
+    Recalcula el sketch de un rubro con los de sus negocios y lo guarda,
+    salvo que otro análisis lo haya modificado mientras tanto.
+    """
+    from firebase_admin import firestore
+    
+    sketch = sketches.merge([sketches.of_business(b) for b in businesses])
+    ref = db.collection(SKETCHES_COLLECTION).document(category_id)
+    
+    @firestore.transactional
+    def save(transaction):
+        snapshot = ref.get(transaction=transaction)
+        if snapshot.exists and snapshot.to_dict().get("version", 0) != version:
+            return
+        transaction.set(ref, {"sketch": sketch, "stale": False, "version": version})
+    
+    save(db.transaction())
+    return sketch
+
+
+def _category_sketches(db, current: dict, stale: dict, all_analyses: Optional[list] = None) -> dict:
+    """
+    Completa los sketches por rubro recalculando los marcados.
+    Con all_analyses, también los de rubros que todavía no tienen sketch.
+    """
+    by_category = None
+    if all_analyses is not None:
+        by_category = {}
+        for business in all_analyses:
+            by_category.setdefault(_category_id(business), []).append(business)
+        for category_id in by_category:
+            if category_id not in current:
+                stale.setdefault(category_id, 0)
+    
+    for category_id, version in stale.items():
+        if by_category is not None:
+            businesses = by_category.get(category_id, [])
+        else:
+            businesses = get_analyses_by_category(category_id)
+        current[category_id] = _rebuild_category_sketch(db, category_id, businesses, version)
+    return current
+
+
+def append_trend_record(place_id: str, record: bytes) -> bool:
+    """
+    Agrega un registro empaquetado al final de la serie de un negocio.
+    Se escribe en el último bloque dentro de una transacción; si no entra, abre otro.
+    """
+    from firebase_admin import firestore
+    
+    db = get_firestore_client()
+    if db is None:
+        return False
+    
+    series_ref = db.collection(TRENDS_COLLECTION).document(place_id)
+    chunks_ref = series_ref.collection(TRENDS_CHUNKS)
+    
+    @firestore.transactional
+    def append(transaction):
+        series = series_ref.get(transaction=transaction)
+        chunks = series.to_dict().get("chunks", 0) if series.exists else 0
+        data = b""
+        if chunks:
+            last = chunks_ref.document(f"{chunks - 1:06d}").get(transaction=transaction)
+            data = bytes(last.to_dict().get("records", b"")) if last.exists else b""
+        if not chunks or len(data) + len(record) > TREND_CHUNK_BYTES:
+            chunks += 1
+            data = b""
+        transaction.set(chunks_ref.document(f"{chunks - 1:06d}"), {"records": data + record})
+        transaction.set(series_ref, {"chunks": chunks})
+    
+    append(db.transaction())
+    return True
+
+
+def get_trend_records(place_id: str) -> Optional[bytes]:
+    """Registros empaquetados de la serie de un negocio (None si no tiene)."""
+    db = get_firestore_client()
+    if db is None:
+        return None
+    
+    chunks = (
+        db.collection(TRENDS_COLLECTION).document(place_id)
+        .collection(TRENDS_CHUNKS).order_by("__name__").stream()
+    )
+    data = b"".join(bytes(chunk.to_dict().get("records", b"")) for chunk in chunks)
+    return data or None
+
+
+def get_category_sketches() -> dict:
+    """Sketches serializados por rubro."""
+    db = get_firestore_client()
+    
+    if db is None:
+        return {}
+    
+    current, stale = _read_category_sketches(db)
+    
+    # Rubros sin documento de sketch (como en history.py, se calculan al vuelo)
+    mirror = _active_mirror()
+    if mirror is not None:
+        return _category_sketches(db, current, stale, mirror.summaries())
+    for category_id in _category_ids(db):
+        if category_id not in current:
+            stale.setdefault(category_id, 0)
+    return _category_sketches(db, current, stale)
+
+
+def _category_ids(db) -> set:
+    """Rubros con algún análisis (lee solo el campo del rubro de cada documento)."""
+    query = (
+        db.collection(COLLECTION_NAME)
+        .select(["category.category_id"])
+        .order_by("__name__")
+    )
+    category_ids = set()
+    for docs in _paged(query):
+        category_ids.update(_category_id(doc.to_dict()) for doc in docs)
+    return category_ids
+
+
 def get_all_analyses() -> list:
     """Obtiene todos los análisis del historial."""
+    mirror = _active_mirror()
+    if mirror is not None:
+        return mirror.get_all()
+    
     db = get_firestore_client()
     
     if db is None:
@@ -55,8 +362,81 @@ def get_all_analyses() -> list:
     return [doc.to_dict() for doc in docs]
 
 
+def iter_analyses(category_id: Optional[str] = None, since: Optional[str] = None,
+                  until: Optional[str] = None):
+    """
+    Recorre los análisis de a uno con consultas paginadas,
+    sin cargar toda la colección en memoria.
+    Filtra por categoría y por analyzed_at (since/until en formato ISO, until inclusivo)
+    dentro de la consulta, así solo se leen los documentos del rango.
+    Categoría + rango necesita un índice compuesto (category.category_id, analyzed_at);
+    si todavía no existe, el rango se filtra aquí.
+    """
+    from google.api_core.exceptions import FailedPrecondition
+    
+    db = get_firestore_client()
+    
+    if db is None:
+        return
+    
+    query = db.collection(COLLECTION_NAME)
+    if category_id:
+        query = query.where("category.category_id", "==", category_id)
+    
+    pages = _paged(_date_range(query, since, until))
+    try:
+        first = next(pages, [])
+    except FailedPrecondition as e:
+        print(f"⚠️ Falta el índice compuesto para filtrar por rubro y fecha: {e}")
+        for docs in _paged(query.order_by("__name__")):
+            for doc in docs:
+                business = doc.to_dict()
+                analyzed_at = business.get("analyzed_at") or ""
+                if since and analyzed_at < since:
+                    continue
+                if until and analyzed_at[:len(until)] > until:
+                    continue
+                yield business
+        return
+    
+    for docs in itertools.chain([first], pages):
+        for doc in docs:
+            yield doc.to_dict()
+
+
+def _date_range(query, since: Optional[str], until: Optional[str]):
+    """
+    Agrega el rango de analyzed_at a la consulta, ordenada para paginar.
+    until es un prefijo inclusivo ("2026-01" incluye todo enero).
+    """
+    if since:
+        query = query.where("analyzed_at", ">=", since)
+    if until:
+        query = query.where("analyzed_at", "<", until + "\uffff")
+    if since or until:
+        query = query.order_by("analyzed_at")
+    return query.order_by("__name__")
+
+
+def _paged(query):
+    """Recorre una consulta ordenada en páginas de PAGE_SIZE documentos."""
+    query = query.limit(PAGE_SIZE)
+    last_doc = None
+    while True:
+        page = query.start_after(last_doc) if last_doc else query
+        docs = list(page.stream())
+        yield docs
+        if len(docs) < PAGE_SIZE:
+            return
+        last_doc = docs[-1]
+
+
 def get_analyses_by_category(category_id: str) -> list:
     """Obtiene análisis filtrados por categoría."""
+    mirror = _active_mirror()
+    if mirror is not None:
+        return mirror.get_by_category(category_id)
+    
     db = get_firestore_client()
     
     if db is None:
@@ -71,6 +451,10 @@ def get_analyses_by_category(category_id: str) -> list:
 
 def get_analysis_by_url(url: str) -> Optional[dict]:
     """Obtiene un análisis específico por URL."""
+    mirror = _active_mirror()
+    if mirror is not None:
+        return mirror.get_by_url(url)
+    
     db = get_firestore_client()
     
     if db is None:
@@ -88,7 +472,19 @@ def get_category_stats() -> dict:
     """
     Obtiene estadísticas agregadas por categoría.
     """
-    all_analyses = get_all_analyses()
+    db = get_firestore_client()
+    
+    if db is None:
+        return {}
+    
+    # Los sketches se leen antes que los análisis: si un análisis llega en el medio,
+    # el rubro recalculado no se guarda (su versión cambió)
+    current, stale = _read_category_sketches(db)
+    
+    # Con el espejo activo alcanzan los resúmenes (sin leer reseñas descartadas)
+    mirror = _active_mirror()
+    all_analyses = mirror.summaries() if mirror is not None else get_all_analyses()
+    category_sketches = _category_sketches(db, current, stale, all_analyses)
     
     stats = {}
     for business in all_analyses:
@@ -104,7 +500,8 @@ def get_category_stats() -> dict:
                 "total_businesses": 0,
                 "total_reviews": 0,
                 "sentiment_totals": {"positive": 0, "neutral": 0, "negative": 0},
-                "bot_totals": {"real": 0, "suspicious": 0, "bot": 0}
+                "bot_totals": {"real": 0, "suspicious": 0, "bot": 0},
+                "sketches": sketches.summarize(category_sketches.get(cat_id))
             }
         
         stats[cat_id]["total_businesses"] += 1
@@ -131,10 +528,78 @@ def delete_analysis(url: str) -> bool:
         return False
     
     doc_id = _generate_id(url)
-    db.collection(COLLECTION_NAME).document(doc_id).delete()
+    doc_ref = db.collection(COLLECTION_NAME).document(doc_id)
+    snapshot = doc_ref.get()
+    doc_ref.delete()
+    if _mirror is not None:
+        _mirror.delete(doc_id)
+    if snapshot.exists:
+        _mark_stale(db, _category_id(snapshot.to_dict()))
+    
+    # Registrar la eliminación para get_changes
+    def record(transaction, stamp):
+        transaction.set(db.collection(DELETIONS_COLLECTION).document(doc_id), {
+            "url": url,
+            "_id": doc_id,
+            "updated_at": stamp
+        })
+    
+    _write_change(db, record)
     return True
 
 
+def get_changes(since: Optional[str] = None, limit: int = CHANGES_LIMIT) -> dict:
+    """
+    Obtiene los negocios agregados, actualizados o eliminados después del cursor.
+    El cursor es el updated_at del último cambio entregado (ver _write_change).
+    Si el historial se limpió después del cursor, retorna reset=True.
+    """
+    db = get_firestore_client()
+    
+    if db is None:
+        return {"businesses": [], "deleted": [], "cursor": since or "", "reset": False, "has_more": False}
+    
+    meta = db.collection(META_COLLECTION).document(META_DOC).get()
+    cleared_at = meta.to_dict().get("cleared_at") if meta.exists else None
+    
+    reset = not since or (cleared_at is not None and since < cleared_at)
+    if reset:
+        # Sincronización completa (los análisis antiguos pueden no tener updated_at)
+        since = ""
+        changed = get_all_analyses()
+        has_more = False
+    else:
+        docs = db.collection(COLLECTION_NAME)\
+                 .where("updated_at", ">", since)\
+                 .order_by("updated_at")\
+                 .limit(limit)\
+                 .stream()
+        changed = [doc.to_dict() for doc in docs]
+        has_more = len(changed) == limit
+    
+    cursor = max([since, cleared_at or ""] + [b.get("updated_at", "") for b in changed])
+    
+    # Eliminaciones después del cursor anterior; si quedan más páginas,
+    # solo las que no pasan al nuevo cursor
+    removed = []
+    if not reset:
+        query = db.collection(DELETIONS_COLLECTION).where("updated_at", ">", since)
+        if has_more:
+            query = query.where("updated_at", "<=", cursor)
+        for doc in query.stream():
+            d = doc.to_dict()
+            removed.append(d["url"])
+            cursor = max(cursor, d["updated_at"])
+    
+    return {
+        "businesses": changed,
+        "deleted": removed,
+        "cursor": cursor,
+        "reset": reset,
+        "has_more": has_more
+    }
+
+
 def clear_history() -> bool:
     """Limpia todo el historial (usar con cuidado)."""
     db = get_firestore_client()
@@ -145,5 +610,14 @@ def clear_history() -> bool:
     docs = db.collection(COLLECTION_NAME).stream()
     for doc in docs:
         doc.reference.delete()
+        if _mirror is not None:
+            _mirror.delete(doc.id)
+    
+    # Las eliminaciones previas ya no importan: los clientes harán reset
+    for doc in db.collection(DELETIONS_COLLECTION).stream():
+        doc.reference.delete()
+    for doc in db.collection(SKETCHES_COLLECTION).stream():
+        doc.reference.delete()
+    _write_change(db, lambda transaction, stamp: {"cleared_at": stamp})
     
     return True
@@ -0,0 +1,87 @@
+"""
+Modo para negocios grandes (clínicas, bancos) con miles de reseñas.
+En vez de una sola llamada con "limit": 50, pide las reseñas por páginas
+("offset" + "limit") con varias llamadas concurrentes, y cada página se
+transforma en un pool de procesos mientras llegan las siguientes.
+La memoria en vuelo queda acotada a CONCURRENCY páginas.
+
+La API de origen debe aceptar "offset", por eso el modo está desactivado
+hasta configurar LARGE_PLACE_API_URL; para desarrollo se puede usar
+POST /mock-companion (LARGE_PLACE_API_URL=http://localhost:8000/mock-companion).
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional
+
+# Sin URL el modo queda desactivado (la API del compañero no pagina con "offset")
+API_URL = os.environ.get("LARGE_PLACE_API_URL", "")
+PAGE_SIZE = int(os.environ.get("LARGE_PLACE_PAGE_SIZE", "50"))
+CONCURRENCY = int(os.environ.get("LARGE_PLACE_CONCURRENCY", "4"))
+# Tope de reseñas por negocio (un documento de Firestore no puede superar 1 MiB)
+MAX_REVIEWS = int(os.environ.get("LARGE_PLACE_MAX_REVIEWS", "1000"))
+# Procesos para transformar páginas (0 = un hilo del servidor)
+WORKERS = int(os.environ.get("LARGE_PLACE_WORKERS", "2"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def is_enabled() -> bool:
+    """Indica si hay una API configurada que acepte "offset"."""
+    return bool(API_URL)
+
+
+def get_pool() -> Optional[ProcessPoolExecutor]:
+    """Pool de procesos compartido (se crea al primer uso; None si WORKERS=0)."""
+    global _pool
+    if WORKERS <= 0:
+        return None
+    with _pool_lock:
+        # Si un proceso murió, el pool queda inutilizable: crear otro
+        if _pool is not None and getattr(_pool, "_broken", False):
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        if _pool is None:
+            # spawn: no heredar hilos ni locks del servidor
+            _pool = ProcessPoolExecutor(WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def shutdown():
+    """Cierra el pool de procesos (al apagar el servidor)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+async def fetch_pages(fetch_page: Callable, on_page: Callable[[dict], bool],
+                      max_reviews: int = MAX_REVIEWS) -> int:
+    """
+    Pide las páginas de a CONCURRENCY en paralelo y entrega cada una a on_page
+    en orden. Termina con una página incompleta, al llegar a max_reviews o
+    cuando on_page retorna False (por ejemplo, si la API ignora "offset").
+    Retorna la cantidad de páginas pedidas.
+    """
+    offset = 0
+    pages = 0
+    while offset < max_reviews:
+        offsets = [
+            offset + i * PAGE_SIZE for i in range(max(1, CONCURRENCY))
+            if offset + i * PAGE_SIZE < max_reviews
+        ]
+        results = await asyncio.gather(*(
+            fetch_page(min(PAGE_SIZE, max_reviews - o), o) for o in offsets
+        ))
+        pages += len(offsets)
+        for data in results:
+            complete = len(data.get("reviews", [])) >= PAGE_SIZE
+            if not on_page(data) or not complete:
+                return pages
+        offset += len(offsets) * PAGE_SIZE
+    return pages
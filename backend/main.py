@@ -3,35 +3,53 @@ Backend FastAPI para el sistema de análisis de sentimientos.
 Soporta clasificación de rubros y almacenamiento de historial.
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
+import asyncio
+import hashlib
+import os
+import threading
+import time
 import httpx
 
-from mock_data import get_mock_data, get_mock_business_analysis
+from mock_data import get_mock_data, get_mock_business_analysis, get_mock_companion_page
 from categories import classify_business, get_all_categories
-
-# Usar Firestore para persistencia en la nube
-# Fallback a history local si Firestore no está configurado
-try:
-    from history_firestore import (
-        add_analysis, 
-        get_all_analyses, 
-        get_analyses_by_category,
-        get_category_stats,
-        clear_history
-    )
-    print("📦 Usando Firestore para historial")
-except ImportError:
-    from history import (
-        add_analysis, 
-        get_all_analyses, 
-        get_analyses_by_category,
-        get_category_stats,
-        clear_history
-    )
-    print("📦 Usando JSON local para historial")
+from trends import record_snapshot, get_trend
+from reviews import (
+    ReviewBatch,
+    SENTIMENTS,
+    BOT_CLASSES,
+    SENTIMENT_CODES,
+    BOT_CODES,
+    INDICATOR_BITS,
+    decode_indicators
+)
+import admission
+import analytics
+import events
+import export
+import large_place
+import reviewers
+import search
+import sketches
+
+# El backend de historial (Firestore o JSON local) se elige en segundo plano
+# al arrancar; ver storage.py
+import storage
+from storage import (
+    add_analysis,
+    get_all_analyses,
+    get_analyses_by_category,
+    get_category_stats,
+    get_category_sketches,
+    get_analysis_by_url,
+    get_changes,
+    iter_analyses,
+    clear_history
+)
 
 app = FastAPI(
     title="Sentiment Analysis API",
@@ -46,13 +64,49 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
 
 
+@app.on_event("startup")
+async def startup():
+    """
+    Inicia en segundo plano la conexión al historial y la carga de los índices
+    de búsqueda, de autores y de analítica, para que el servidor responda de inmediato.
+    """
+    storage.start()
+    threading.Thread(target=_load_indexes, daemon=True).start()
+
+
+@app.on_event("shutdown")
+def shutdown():
+    """Cierra el pool de procesos del modo para negocios grandes."""
+    large_place.shutdown()
+
+
+def _load_indexes():
+    """
+    Carga los índices en memoria leyendo el historial una sola vez.
+    Los análisis guardados durante la lectura quedan en espera en cada índice
+    y se aplican al terminar (ver start_loading/finish_loading).
+    """
+    indexes = (search, reviewers, analytics)
+    for index in indexes:
+        index.start_loading()
+    analyses = None
+    try:
+        analyses = get_all_analyses()
+    finally:
+        for index in indexes:
+            index.finish_loading(analyses)
+
+
 class AnalyzeRequest(BaseModel):
     """Modelo para solicitud de análisis."""
     url: str
     business_name: Optional[str] = None
+    # Negocios con miles de reseñas: pedirlas por páginas (ver large_place.py)
+    large_place: bool = False
 
 
 # ============== ENDPOINTS ==============
@@ -66,9 +120,20 @@ async def root():
         "endpoints": {
             "/analyze": "POST - Analizar URL de Google Maps",
             "/history": "GET - Obtener historial completo",
+            "/history/changes?since=": "GET - Cambios del historial desde un cursor",
             "/history/category/{id}": "GET - Historial por rubro",
+            "/export": "GET - Exportar historial (ndjson, csv, reviews_csv; gzip opcional)",
             "/categories": "GET - Lista de rubros disponibles",
-            "/stats": "GET - Estadísticas por rubro"
+            "/stats": "GET - Estadísticas por rubro",
+            "/stats/sketches": "GET - Autores distintos y cuantiles aproximados (combina rubros)",
+            "/trends/{place_id}": "GET - Evolución del sentimiento de un negocio",
+            "/analytics": "GET - Consultas agregadas (group_by, filtros, medidas)",
+            "/search": "GET - Búsqueda de texto en reseñas",
+            "/events": "GET - Eventos en vivo (SSE) de nuevos análisis",
+            "/mock-companion": "POST - API del compañero simulada con paginación (desarrollo)",
+            "/metrics": "GET - Métricas de la cola de /analyze",
+            "/health": "GET - Liveness (incluye estado del historial)",
+            "/health/ready": "GET - Readiness (503 hasta que el historial esté listo)"
         }
     }
 
@@ -79,46 +144,86 @@ async def list_categories():
     return get_all_categories()
 
 
-@app.post("/analyze")
-async def analyze_url(request: AnalyzeRequest):
+@app.post("/analyze", dependencies=[Depends(storage.wait_ready)])
+async def analyze_url(request: AnalyzeRequest, http_request: Request):
     """
     Analiza una URL de Google Maps.
-    Llama a la API del compañero, clasifica el rubro y guarda en historial.
+    Pasa por el control de admisión (429 si hay demasiados pedidos).
     """
-    # URL de la API del compañero (ya desplegada en Render)
-    COMPANION_API_URL = "https://modelscrappyv2.onrender.com/analyze"
+    if request.large_place and not large_place.is_enabled():
+        raise HTTPException(
+            status_code=400,
+            detail="El modo large_place requiere configurar LARGE_PLACE_API_URL (una API que acepte offset)"
+        )
+    async with admission.admit(admission.client_key(http_request)):
+        return await run_analysis(request)
+
+
+# URL de la API del compañero (ya desplegada en Render)
+COMPANION_API_URL = "https://modelscrappyv2.onrender.com/analyze"
+
+# Tope de reseñas guardadas por negocio, contando las previas que ya no vienen
+# en el scraping (un documento de Firestore no puede superar 1 MiB)
+MAX_STORED_REVIEWS = int(os.environ.get("MAX_STORED_REVIEWS", str(large_place.MAX_REVIEWS)))
+# Tope por tamaño estimado de las reseñas guardadas (deja lugar a resúmenes y sketches)
+MAX_STORED_REVIEW_BYTES = int(os.environ.get("MAX_STORED_REVIEW_BYTES", str(900 * 1024)))
+
+# Reseñas y demora por página de /mock-companion
+MOCK_COMPANION_TOTAL = int(os.environ.get("MOCK_COMPANION_TOTAL", "2000"))
+MOCK_COMPANION_LATENCY = float(os.environ.get("MOCK_COMPANION_LATENCY", "0"))
+
+
+async def fetch_companion(client: httpx.AsyncClient, api_url: str, maps_url: str,
+                          limit: int, offset: Optional[int] = None) -> dict:
+    """Pide reseñas a la API del compañero (una página si se indica offset)."""
+    payload = {
+        "maps_url": maps_url,
+        "forceUpdate": False,
+        "limit": limit
+    }
+    if offset is not None:
+        payload["offset"] = offset
+    response = await client.post(api_url, json=payload)
+    
+    print(f"📡 Respuesta del compañero: {response.status_code}")
     
+    # Si hay error HTTP, mostrar el body del error
+    if response.status_code != 200:
+        error_detail = response.text
+        print(f"❌ Error del compañero: {error_detail}")
+        raise HTTPException(
+            status_code=response.status_code, 
+            detail=f"API del modelo respondió con error: {error_detail[:500]}"
+        )
+    
+    return response.json()
+
+
+async def run_analysis(request: AnalyzeRequest):
+    """
+    Llama a la API del compañero, clasifica el rubro y guarda en historial.
+    """
     try:
         print(f"🔄 Llamando API del compañero con URL: {request.url}")
         
+        # El índice de autores debe estar cargado para detectar ráfagas entre negocios.
+        # Si ya existe un análisis previo, solo se procesan las reseñas nuevas.
+        await asyncio.to_thread(reviewers.ensure_loaded, get_all_analyses)
+        previous = get_analysis_by_url(request.url)
+        
         # Llamar a la API del compañero (timeout alto porque puede tardar)
         async with httpx.AsyncClient(timeout=180.0) as client:
-            response = await client.post(
-                COMPANION_API_URL,
-                json={
-                    "maps_url": request.url,
-                    "forceUpdate": False,
-                    "limit": 50
-                }
-            )
-            
-            print(f"📡 Respuesta del compañero: {response.status_code}")
-            
-            # Si hay error HTTP, mostrar el body del error
-            if response.status_code != 200:
-                error_detail = response.text
-                print(f"❌ Error del compañero: {error_detail}")
-                raise HTTPException(
-                    status_code=response.status_code, 
-                    detail=f"API del modelo respondió con error: {error_detail[:500]}"
-                )
-            
-            companion_data = response.json()
-            print(f"✅ Datos recibidos: {len(companion_data.get('reviews', []))} reseñas")
-        
-        # Mapear respuesta del compañero a nuestro formato
-        analysis_data = transform_companion_response(companion_data, request.url)
+            if request.large_place:
+                analysis_data = await analyze_large_place(client, request.url, previous)
+            else:
+                companion_data = await fetch_companion(client, COMPANION_API_URL, request.url, 50)
+                print(f"✅ Datos recibidos: {len(companion_data.get('reviews', []))} reseñas")
+                
+                # Mapear respuesta del compañero a nuestro formato
+                analysis_data = transform_companion_response(companion_data, request.url, previous)
         
+    except HTTPException:
+        raise
     except httpx.TimeoutException:
         print("⏱️ Timeout llamando API del compañero")
         raise HTTPException(status_code=504, detail="La API del modelo tardó demasiado (>180s). Intenta de nuevo.")
@@ -135,22 +240,81 @@ async def analyze_url(request: AnalyzeRequest):
     analysis_data["category"] = category
     analysis_data["url"] = request.url
     
-    # Guardar en historial
-    saved = add_analysis(analysis_data)
+    # Pasar las reseñas al formato JSON solo al guardar/responder
+    analysis_data["reviews"] = analysis_data["reviews"].to_dicts()
+    
+    # Guardar en historial (por ejemplo, Firestore rechaza documentos de más de 1 MiB)
+    try:
+        saved = add_analysis(analysis_data)
+    except Exception as e:
+        print(f"💾 Error guardando el análisis: {e}")
+        raise HTTPException(status_code=500, detail=f"No se pudo guardar el análisis: {str(e)[:500]}")
+    
+    # Agregar registro a la serie de tiempo del negocio
+    record_snapshot(saved)
+    
+    # Actualizar columnas de analítica e índice de búsqueda
+    await asyncio.to_thread(analytics.index_analysis, saved)
+    await asyncio.to_thread(search.index_analysis, saved)
+    await asyncio.to_thread(reviewers.index_analysis, saved)
+    
+    # Avisar a los dashboards conectados
+    events.publish_analysis(saved, previous)
     
     return saved
 
 
-@app.get("/history")
+@app.get("/history", dependencies=[Depends(storage.wait_ready)])
 async def get_history():
     """Obtiene todo el historial de análisis."""
+    businesses = get_all_analyses()
     return {
-        "businesses": get_all_analyses(),
-        "total": len(get_all_analyses())
+        "businesses": businesses,
+        "total": len(businesses)
     }
 
 
-@app.get("/history/category/{category_id}")
+@app.get("/history/changes", dependencies=[Depends(storage.wait_ready)])
+async def get_history_changes(since: Optional[str] = None):
+    """
+    Obtiene solo los negocios agregados, actualizados o eliminados desde el cursor.
+    Sin cursor (o si el historial se limpió) retorna todo con reset=true.
+    """
+    return get_changes(since)
+
+
+@app.get("/export", dependencies=[Depends(storage.wait_ready)])
+async def export_history(
+    format: str = "ndjson",
+    category: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    gzip: bool = False
+):
+    """
+    Exporta el historial por partes (la memoria no crece con el historial).
+    Formatos: ndjson (un negocio por línea), csv (un negocio por fila) y
+    reviews_csv (una reseña por fila, compatible con reviews_google_maps.csv).
+    since/until filtran por fecha de análisis (ISO, until inclusivo).
+    """
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Formato desconocido: {format}")
+    
+    media_type, extension = export.FORMATS[format]
+    filename = f"historial_{format}.{extension}"
+    if gzip:
+        media_type = "application/gzip"
+        filename += ".gz"
+    
+    analyses = iter_analyses(category, since, until)
+    return StreamingResponse(
+        export.encode(export.export_chunks(analyses, format), compress=gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@app.get("/history/category/{category_id}", dependencies=[Depends(storage.wait_ready)])
 async def get_history_by_category(category_id: str):
     """Obtiene historial filtrado por categoría."""
     businesses = get_analyses_by_category(category_id)
@@ -161,17 +325,123 @@ async def get_history_by_category(category_id: str):
     }
 
 
-@app.get("/stats")
+@app.get("/stats", dependencies=[Depends(storage.wait_ready)])
 async def get_stats():
     """Obtiene estadísticas agregadas por categoría."""
     return get_category_stats()
 
 
-@app.delete("/history")
+@app.get("/stats/sketches", dependencies=[Depends(storage.wait_ready)])
+async def get_sketch_stats(categories: Optional[str] = None):
+    """
+    Autores distintos, cuantiles de confianza y de largo del texto, y distribución
+    de ratings, combinando los sketches de los rubros pedidos (todos por defecto).
+    Los valores son aproximados; cada uno trae su cota de error.
+    """
+    category_sketches = get_category_sketches()
+    selected = [c for c in categories.split(",") if c] if categories else list(category_sketches)
+    return {
+        "categories": [c for c in selected if c in category_sketches],
+        **sketches.summarize(sketches.merge([category_sketches.get(c) for c in selected]))
+    }
+
+
+@app.get("/trends/{place_id}", dependencies=[Depends(storage.wait_ready)])
+async def get_trends(
+    place_id: str,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    points: int = 200
+):
+    """
+    Obtiene la evolución de un negocio en el tiempo.
+    start/end son timestamps epoch (segundos); points limita la cantidad de puntos.
+    """
+    trend = get_trend(place_id, start, end, points)
+    if trend is None:
+        raise HTTPException(status_code=404, detail="No hay registros para este negocio")
+    return trend
+
+
+@app.get("/analytics", dependencies=[Depends(storage.wait_ready)])
+async def get_analytics(
+    group_by: str = "category",
+    measures: str = "count,mean_rating,bot_share",
+    category: Optional[str] = None,
+    business: Optional[str] = None,
+    sentiment: Optional[str] = None,
+    bot_classification: Optional[str] = None,
+    min_rating: Optional[int] = None,
+    max_rating: Optional[int] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    hist_bins: int = 10
+):
+    """
+    Consulta agregada sobre todas las reseñas guardadas.
+    group_by y measures son listas separadas por comas.
+    Dimensiones: category, business, sentiment, bot_classification, rating.
+    Medidas: count, mean_rating, mean_confidence, bot_share, suspicious_share, confidence_hist.
+    """
+    # Fuera del event loop: la primera carga lee todo el historial
+    await asyncio.to_thread(analytics.ensure_loaded, get_all_analyses)
+    filters = {
+        "category": category,
+        "business": business,
+        "sentiment": sentiment,
+        "bot_classification": bot_classification,
+        "min_rating": min_rating,
+        "max_rating": max_rating,
+        "since": since,
+        "until": until
+    }
+    try:
+        return await asyncio.to_thread(
+            analytics.query,
+            [d for d in group_by.split(",") if d],
+            [m for m in measures.split(",") if m],
+            filters,
+            max(1, min(hist_bins, 100))
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/search", dependencies=[Depends(storage.wait_ready)])
+async def search_reviews(
+    q: str,
+    category: Optional[str] = None,
+    sentiment: Optional[str] = None,
+    bot_classification: Optional[str] = None,
+    page: int = 1,
+    page_size: int = 20
+):
+    """
+    Busca reseñas por texto en todos los negocios (sin distinguir acentos).
+    Los resultados vienen ordenados por relevancia con el término resaltado.
+    """
+    # Fuera del event loop: la primera carga y la búsqueda toman el lock del índice
+    await asyncio.to_thread(search.ensure_loaded, get_all_analyses)
+    return await asyncio.to_thread(
+        search.search,
+        q,
+        category=category,
+        sentiment=sentiment,
+        bot_classification=bot_classification,
+        page=max(1, page),
+        page_size=max(1, min(page_size, 100))
+    )
+
+
+@app.delete("/history", dependencies=[Depends(storage.wait_ready)])
 async def delete_history():
     """Limpia todo el historial."""
     success = clear_history()
+    analytics.reset()
+    search.reset()
+    reviewers.reset()
     if success:
+        events.publish_clear()
         return {"message": "Historial eliminado correctamente"}
     raise HTTPException(status_code=500, detail="Error al eliminar historial")
 
@@ -182,14 +452,70 @@ async def get_mock_analysis():
     return get_mock_data()
 
 
+@app.post("/mock-companion")
+async def mock_companion(payload: dict):
+    """
+    Imita la API del compañero con paginación ("offset" + "limit"), para probar
+    el modo de negocios grandes sin depender del servicio real (para desarrollo).
+    """
+    await asyncio.sleep(MOCK_COMPANION_LATENCY)
+    return get_mock_companion_page(
+        payload.get("maps_url", ""),
+        int(payload.get("offset", 0) or 0),
+        int(payload.get("limit", 50) or 50),
+        MOCK_COMPANION_TOTAL
+    )
+
+
+@app.get("/events")
+async def subscribe_events(request: Request):
+    """
+    Canal en vivo (Server-Sent Events) con cada análisis nuevo y los cambios
+    en las estadísticas por rubro. Eventos: analysis, clear, resync.
+    """
+    return StreamingResponse(
+        events.stream(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Métricas de la cola de análisis, del canal de eventos y del índice de autores."""
+    return {
+        "analyze": admission.get_metrics(),
+        "events": events.get_stats(),
+        "reviewers": reviewers.get_stats()
+    }
+
+
 @app.get("/health")
 async def health_check():
-    """Verificar que el servidor está funcionando."""
-    return {"status": "healthy", "version": "2.0.0"}
+    """
+    Liveness: el servidor está funcionando.
+    Incluye si el historial ya está listo (readiness) sin esperar por él.
+    """
+    return {"status": "healthy", "version": "2.0.0", "storage": storage.status()}
+
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness: 200 cuando el historial está listo, 503 mientras se inicializa."""
+    if not storage.is_ready():
+        raise HTTPException(status_code=503, detail="Inicializando historial", headers={"Retry-After": "5"})
+    return {"status": "ready", "storage": storage.status()}
 
 
 # ============== UTILIDADES ==============
 
+# Mapeo de sentimientos del compañero a nuestros códigos
+SENTIMENT_MAP = {
+    "POS": SENTIMENT_CODES["positive"],
+    "NEU": SENTIMENT_CODES["neutral"],
+    "NEG": SENTIMENT_CODES["negative"]
+}
+
 def extract_name_from_url(url: str) -> str:
     """Extrae un nombre aproximado de la URL de Google Maps."""
     # Intentar extraer de patterns comunes de Google Maps
@@ -201,69 +527,209 @@ def extract_name_from_url(url: str) -> str:
     return "Negocio sin nombre"
 
 
-def transform_companion_response(data: dict, url: str) -> dict:
+def review_fingerprint(review: dict) -> str:
+    """
+    Genera una huella de la reseña original (usuario + texto + fecha).
+    No usa scraping_date porque cambia en cada scraping.
+    """
+    key = "\x1f".join([
+        str(review.get("username", "")),
+        str(review.get("review_text", "")),
+        str(review.get("review_date", review.get("date", "")))
+    ])
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def transform_review(review: dict, fingerprint: str, batch: ReviewBatch, burst: bool = False):
+    """
+    Transforma una reseña del compañero y la agrega al lote con su bot score.
+    burst indica que el autor dejó reseñas similares en otros negocios (ver reviewers.py).
+    La reseña queda marcada como vista por primera vez ahora.
+    """
+    confidence = review.get("confidence", 0.5)
+    
+    # Calcular bot score basado en patrones
+    bot_score = calculate_bot_score(review, burst)
+    bot_classification = "real" if bot_score <= 30 else ("suspicious" if bot_score <= 60 else "bot")
+    
+    # Rating puede venir como float, convertir a int
+    rating = int(review.get("rating", 3) or 0)
+    
+    batch.append(
+        review.get("username", "Anónimo"),
+        review.get("review_text", ""),
+        min(max(rating, 0), 5),
+        SENTIMENT_MAP.get(review.get("sentiment", "NEU"), 1),
+        float(confidence) if confidence else 0.5,
+        bot_score,
+        BOT_CODES[bot_classification],
+        bot_indicator_mask(review, burst),
+        fingerprint,
+        int(time.time())
+    )
+
+
+def known_reviews(previous: Optional[dict]) -> tuple:
+    """
+    Reseñas ya procesadas de un análisis previo y su índice por huella.
+    Los análisis antiguos sin huellas no se reutilizan (se reprocesa todo);
+    las reseñas guardadas sin first_seen toman el analyzed_at del análisis previo.
+    """
+    known = ReviewBatch()
+    known_index = {}
+    if previous:
+        previous_reviews = previous.get("reviews", [])
+        if isinstance(previous_reviews, ReviewBatch):
+            known = previous_reviews
+        elif all(r.get("fingerprint") for r in previous_reviews):
+            known = ReviewBatch.from_dicts(
+                previous_reviews, reviewers.timestamp(previous.get("analyzed_at"))
+            )
+        known_index = {f: i for i, f in enumerate(known.fingerprints) if f}
+    return known, known_index
+
+
+def keep_missing(known: ReviewBatch, known_index: dict, seen: set, batch: ReviewBatch) -> int:
+    """
+    Conserva en `batch` las reseñas previas que ya no vienen en el scraping,
+    las vistas más recientemente primero, sin pasar de MAX_STORED_REVIEWS.
+    Retorna cuántas se descartaron.
+    """
+    missing = [i for fingerprint, i in known_index.items() if fingerprint not in seen]
+    missing.sort(key=lambda i: known.first_seen[i], reverse=True)
+    room = max(MAX_STORED_REVIEWS - len(batch), 0)
+    for i in missing[:room]:
+        batch.append_from(known, i)
+    return max(len(missing) - room, 0)
+
+
+def store_reviews(new_reviews: ReviewBatch, reused: ReviewBatch, known: ReviewBatch,
+                  known_index: dict, seen: set) -> tuple:
+    """
+    Arma el lote a guardar: las nuevas, las reutilizadas y las previas que ya no
+    vienen en el scraping (ver keep_missing). Si el tamaño estimado supera
+    MAX_STORED_REVIEW_BYTES, descarta reseñas desde el final (las más viejas).
+    Retorna el lote y cuántas reseñas se descartaron.
+    """
+    batch = ReviewBatch()
+    batch.extend(new_reviews)
+    batch.extend(reused)
+    dropped = keep_missing(known, known_index, seen, batch)
+    
+    size = 0
+    for i in range(len(batch)):
+        size += batch.approx_bytes(i)
+        if size > MAX_STORED_REVIEW_BYTES:
+            dropped += len(batch) - i
+            batch.truncate(i)
+            break
+    return batch, dropped
+
+
+def summarize(new_reviews: ReviewBatch, stored: ReviewBatch, previous: Optional[dict],
+              raw: Optional[dict] = None) -> dict:
+    """
+    Resúmenes del negocio, iguales en el modo normal y en el de negocios grandes.
+    Cuentan todas las reseñas vistas: con un análisis previo reutilizable (`previous`)
+    se suman las nuevas a sus totales, aunque las más viejas ya no se guarden.
+    En un primer análisis se usan los totales del compañero (`raw`) si vienen.
+    El rating promedio de un re-análisis se calcula sobre las reseñas guardadas.
+    """
+    new_sentiments = new_reviews.counts("sentiments", len(SENTIMENTS))
+    new_bots = new_reviews.counts("bot_classes", len(BOT_CLASSES))
+    new_count = len(new_reviews)
+    bot_stats = {key: new_bots[BOT_CODES[key]] for key in BOT_CLASSES}
+    
+    if previous is not None:
+        # Actualización incremental sobre el análisis previo
+        prev_summary = previous.get("sentiment_summary", {})
+        prev_bots = previous.get("bot_stats", {})
+        sentiment_summary = {
+            key: prev_summary.get(key, 0) + new_sentiments[SENTIMENT_CODES[key]]
+            for key in SENTIMENTS
+        }
+        bot_stats = {key: prev_bots.get(key, 0) + bot_stats[key] for key in BOT_CLASSES}
+        total_reviews = previous.get("total_reviews", 0) + new_count
+    elif raw is not None:
+        # Mapear sentiment_summary del compañero
+        raw_summary = raw.get("sentiment_summary", {})
+        sentiment_summary = {
+            "positive": raw_summary.get("POS", 0),
+            "neutral": raw_summary.get("NEU", 0),
+            "negative": raw_summary.get("NEG", 0)
+        }
+        total_reviews = raw.get("total_reviews", new_count)
+    else:
+        sentiment_summary = {key: new_sentiments[SENTIMENT_CODES[key]] for key in SENTIMENTS}
+        total_reviews = new_count
+    
+    if previous is None and raw is not None:
+        average_rating = raw.get("average_rating", 0)
+    else:
+        rated = len(stored)
+        average_rating = round(sum(stored.ratings) / rated, 2) if rated else 0
+    
+    return {
+        "total_reviews": total_reviews,
+        "average_rating": average_rating,
+        "sentiment_summary": sentiment_summary,
+        "bot_stats": bot_stats,
+    }
+
+
+def transform_companion_response(data: dict, url: str, previous: Optional[dict] = None) -> dict:
     """
     Transforma la respuesta de la API del compañero a nuestro formato.
     Mapea POS/NEG/NEU a positive/negative/neutral y calcula bot scores.
+    Las reseñas quedan en un ReviewBatch; usar to_dicts() al responder o guardar.
+    
+    Si se pasa un análisis previo con huellas, reutiliza las reseñas ya
+    procesadas y actualiza sentiment_summary/bot_stats solo con las nuevas
+    (ver summarize y store_reviews).
     """
     try:
-        # Mapeo de sentimientos
-        sentiment_map = {"POS": "positive", "NEG": "negative", "NEU": "neutral"}
+        # Reseñas ya procesadas, indexadas por huella
+        known, known_index = known_reviews(previous)
         
-        # Transformar cada reseña
-        transformed_reviews = []
+        # Transformar solo las reseñas nuevas
+        new_reviews = ReviewBatch()
+        reused = ReviewBatch()
+        seen = set()
         for review in data.get("reviews", []):
-            sentiment_code = review.get("sentiment", "NEU")
-            confidence = review.get("confidence", 0.5)
+            fingerprint = review_fingerprint(review)
+            if fingerprint in seen:
+                continue
+            seen.add(fingerprint)
             
-            # Calcular bot score basado en patrones
-            bot_score = calculate_bot_score(review)
-            bot_classification = "real" if bot_score <= 30 else ("suspicious" if bot_score <= 60 else "bot")
-            
-            # Rating puede venir como float, convertir a int
-            rating = review.get("rating", 3)
-            if isinstance(rating, float):
-                rating = int(rating)
-            
-            transformed_reviews.append({
-                "author": review.get("username", "Anónimo"),
-                "text": review.get("review_text", ""),
-                "rating": rating,
-                "sentiment": sentiment_map.get(sentiment_code, "neutral"),
-                "confidence": float(confidence) if confidence else 0.5,
-                "bot_score": bot_score,
-                "bot_classification": bot_classification,
-                "bot_indicators": get_bot_indicators(review)
-            })
-        
-        # Mapear sentiment_summary
-        raw_summary = data.get("sentiment_summary", {})
-        sentiment_summary = {
-            "positive": raw_summary.get("POS", 0),
-            "neutral": raw_summary.get("NEU", 0),
-            "negative": raw_summary.get("NEG", 0)
-        }
+            if fingerprint in known_index:
+                reused.append_from(known, known_index[fingerprint])
+            else:
+                burst = reviewers.is_burst(
+                    review.get("username", ""), url,
+                    int(review.get("rating", 3) or 0), review.get("review_text", "")
+                )
+                transform_review(review, fingerprint, new_reviews, burst)
         
-        # Calcular estadísticas de bots
-        real_count = sum(1 for r in transformed_reviews if r["bot_classification"] == "real")
-        suspicious_count = sum(1 for r in transformed_reviews if r["bot_classification"] == "suspicious")
-        bot_count = sum(1 for r in transformed_reviews if r["bot_classification"] == "bot")
+        # Guardar las nuevas, las reutilizadas y las previas que ya no vienen (con tope)
+        new_count = len(new_reviews)
+        transformed_reviews, dropped_count = store_reviews(
+            new_reviews, reused, known, known_index, seen
+        )
+        reused_count = max(len(transformed_reviews) - new_count, 0)
         
         result = {
             "name": data.get("business_name", "Negocio"),
             "url": url,
-            "total_reviews": data.get("total_reviews", len(transformed_reviews)),
-            "average_rating": data.get("average_rating", 0),
-            "sentiment_summary": sentiment_summary,
-            "bot_stats": {
-                "real": real_count,
-                "suspicious": suspicious_count,
-                "bot": bot_count
-            },
-            "reviews": transformed_reviews
+            **summarize(new_reviews, transformed_reviews, previous if known_index else None, data),
+            "reviews": transformed_reviews,
+            "incremental": {
+                "new_reviews": new_count,
+                "reused_reviews": reused_count,
+                "dropped_reviews": dropped_count
+            }
         }
         
-        print(f"🔄 Transformación completada: {len(transformed_reviews)} reseñas procesadas")
+        print(f"🔄 Transformación completada: {new_count} reseñas nuevas, {reused_count} reutilizadas")
         return result
         
     except Exception as e:
@@ -273,8 +739,103 @@ def transform_companion_response(data: dict, url: str) -> dict:
         raise
 
 
-def calculate_bot_score(review: dict) -> int:
-    """Calcula un puntaje de probabilidad de bot (0-100)."""
+def transform_page(reviews: list, fingerprints: list, bursts: list) -> ReviewBatch:
+    """
+    Transforma una página de reseñas nuevas (corre en el pool de procesos).
+    Las huellas y las ráfagas se calculan antes, en el servidor.
+    """
+    batch = ReviewBatch()
+    for review, fingerprint, burst in zip(reviews, fingerprints, bursts):
+        transform_review(review, fingerprint, batch, burst)
+    return batch
+
+
+async def analyze_large_place(client: httpx.AsyncClient, url: str,
+                              previous: Optional[dict] = None) -> dict:
+    """
+    Modo para negocios grandes: pide las reseñas por páginas concurrentes y
+    transforma cada página en el pool de procesos mientras llegan las demás.
+    Los resúmenes se calculan al final igual que en el modo normal (ver summarize).
+    """
+    known, known_index = known_reviews(previous)
+    loop = asyncio.get_running_loop()
+    pool = large_place.get_pool()
+    
+    info = {}
+    seen = set()
+    reused = ReviewBatch()
+    pending = []
+    
+    async def fetch_page(limit: int, offset: int) -> dict:
+        return await fetch_companion(client, large_place.API_URL, url, limit, offset)
+    
+    def on_page(data: dict) -> bool:
+        """Descarta repetidas, separa las ya procesadas y envía el resto al pool."""
+        info.setdefault("business_name", data.get("business_name"))
+        reviews, fingerprints, bursts = [], [], []
+        fresh = 0
+        for review in data.get("reviews", []):
+            fingerprint = review_fingerprint(review)
+            if fingerprint in seen:
+                continue
+            seen.add(fingerprint)
+            fresh += 1
+            if fingerprint in known_index:
+                reused.append_from(known, known_index[fingerprint])
+                continue
+            reviews.append(review)
+            fingerprints.append(fingerprint)
+            bursts.append(reviewers.is_burst(
+                review.get("username", ""), url,
+                int(review.get("rating", 3) or 0), review.get("review_text", "")
+            ))
+        if reviews:
+            pending.append(loop.run_in_executor(pool, transform_page, reviews, fingerprints, bursts))
+        # Una página sin reseñas nuevas indica que la API no respeta "offset"
+        return fresh > 0
+    
+    pages = await large_place.fetch_pages(fetch_page, on_page)
+    
+    # Combinar las páginas (en orden) y conservar las previas que no volvieron a venir (con tope)
+    new_reviews = ReviewBatch()
+    for batch in await asyncio.gather(*pending):
+        new_reviews.extend(batch)
+    new_count = len(new_reviews)
+    transformed_reviews, dropped_count = store_reviews(new_reviews, reused, known, known_index, seen)
+    reused_count = max(len(transformed_reviews) - new_count, 0)
+    
+    print(f"📚 Negocio grande: {pages} páginas, {new_count} reseñas nuevas, {reused_count} reutilizadas")
+    return {
+        "name": info.get("business_name") or "Negocio",
+        "url": url,
+        **summarize(new_reviews, transformed_reviews, previous if known_index else None),
+        "reviews": transformed_reviews,
+        "incremental": {
+            "new_reviews": new_count,
+            "reused_reviews": reused_count,
+            "dropped_reviews": dropped_count
+        },
+        "large_place": {
+            "pages": pages,
+            "page_size": large_place.PAGE_SIZE,
+            "concurrency": large_place.CONCURRENCY
+        }
+    }
+
+
+GENERIC_PHRASES = {"excelente", "muy bueno", "recomendado", "bueno", "ok", "malo"}
+
+
+def _has_few_words(text: str) -> bool:
+    """Indica si el texto tiene 3 palabras o menos (sin partir todo el texto)."""
+    return len(text.split(maxsplit=3)) <= 3
+
+
+def calculate_bot_score(review: dict, burst: bool = False) -> int:
+    """
+    Calcula un puntaje de probabilidad de bot (0-100).
+    burst: el autor dejó reseñas cortas y extremas en varios negocios en poco tiempo.
+    """
     score = 0
     text = review.get("review_text", "")
     
@@ -283,8 +844,7 @@ def calculate_bot_score(review: dict) -> int:
         score += 25
     
     # Frases genéricas (+25)
-    generic_phrases = ["excelente", "muy bueno", "recomendado", "bueno", "ok", "malo"]
-    if text.lower().strip() in generic_phrases or len(text.split()) <= 3:
+    if text.strip().lower() in GENERIC_PHRASES or _has_few_words(text):
         score += 25
     
     # Rating extremo sin justificación (+15)
@@ -297,28 +857,40 @@ def calculate_bot_score(review: dict) -> int:
     if confidence < 0.6:
         score += 20
     
+    # Ráfaga en varios negocios (+30)
+    if burst:
+        score += 30
+    
     return min(score, 100)
 
 
-def get_bot_indicators(review: dict) -> list:
-    """Retorna lista de indicadores de bot detectados."""
-    indicators = []
+def bot_indicator_mask(review: dict, burst: bool = False) -> int:
+    """Calcula los indicadores de bot detectados como máscara de bits."""
+    mask = 0
     text = review.get("review_text", "")
     
     if len(text) < 20:
-        indicators.append("short_text")
+        mask |= INDICATOR_BITS["short_text"]
     
-    if len(text.split()) <= 3:
-        indicators.append("generic_phrases")
+    if _has_few_words(text):
+        mask |= INDICATOR_BITS["generic_phrases"]
     
     if review.get("confidence", 1.0) < 0.6:
-        indicators.append("low_confidence")
+        mask |= INDICATOR_BITS["low_confidence"]
     
     rating = review.get("rating", 3)
     if rating in [1, 5] and len(text) < 50:
-        indicators.append("extreme_rating")
+        mask |= INDICATOR_BITS["extreme_rating"]
+    
+    if burst:
+        mask |= INDICATOR_BITS["multi_place_burst"]
     
-    return indicators
+    return mask
+
+
+def get_bot_indicators(review: dict, burst: bool = False) -> list:
+    """Retorna lista de indicadores de bot detectados."""
+    return decode_indicators(bot_indicator_mask(review, burst))
 
 
 # ============== PARA CORRER ==============
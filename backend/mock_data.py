@@ -198,3 +198,42 @@ MOCK_ANALYSIS = {
 def get_mock_data():
     """Retorna los datos simulados de análisis."""
     return MOCK_ANALYSIS
+
+
+def get_mock_companion_page(maps_url: str, offset: int, limit: int, total: int) -> dict:
+    """
+    Página de reseñas en el formato de la API del compañero.
+    Cada reseña depende solo de la URL y su posición, así las páginas
+    son estables entre llamadas.
+    """
+    sentiment_codes = {"positive": "POS", "neutral": "NEU", "negative": "NEG", "bot": "POS"}
+    scraping_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    
+    reviews = []
+    for i in range(max(offset, 0), min(offset + limit, total)):
+        rng = random.Random(f"{maps_url}:{i}")
+        sentiment = rng.choices(["positive", "neutral", "negative", "bot"], [6, 2, 1, 1])[0]
+        sample = rng.choice(SAMPLE_REVIEWS[sentiment])
+        reviews.append({
+            "business_name": "Negocio de prueba",
+            "username": f"{rng.choice(SAMPLE_AUTHORS)} {i}",
+            "rating": sample["rating"],
+            "review_text": sample["text"],
+            "source": "Google Maps",
+            "scraping_date": scraping_date,
+            "sentiment": sentiment_codes[sentiment],
+            "confidence": round(rng.uniform(0.55, 0.98), 4)
+        })
+    
+    summary = {"POS": 0, "NEU": 0, "NEG": 0}
+    for review in reviews:
+        summary[review["sentiment"]] += 1
+    
+    return {
+        "business_name": "Negocio de prueba",
+        "total_reviews": len(reviews),
+        "sentiment_summary": summary,
+        "average_rating": round(sum(r["rating"] for r in reviews) / len(reviews), 2) if reviews else 0,
+        "reviews": reviews,
+        "cached": False
+    }
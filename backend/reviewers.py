@@ -0,0 +1,214 @@
+"""
+Índice de autores entre negocios, para detectar bots coordinados.
+Por cada usuario (nombre normalizado e internado) guarda sus reseñas en un
+bytearray con registros fijos: negocio, momento, rating y largo del texto.
+Así un usuario que deja reseñas cortas y extremas en varios negocios en poco
+tiempo se detecta con una sola consulta por reseña.
+El índice vive en memoria y se reconstruye desde el historial al arrancar
+(cada reseña guardada trae su first_seen; las más antiguas, sin ese dato,
+toman el analyzed_at de su negocio).
+"""
+
+import os
+import struct
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+from reviews import normalize_author
+
+# Registro por reseña: negocio (u32), momento en segundos (u32), rating (u8), largo (u16)
+_RECORD = struct.Struct("<IIBH")
+
+# Reseñas que se guardan por usuario (las más recientes)
+MAX_PER_AUTHOR = 64
+
+# Ventana y cantidad de negocios que se consideran una ráfaga
+BURST_DAYS = float(os.environ.get("REVIEWER_BURST_DAYS", "7"))
+BURST_PLACES = int(os.environ.get("REVIEWER_BURST_PLACES", "3"))
+
+# Qué se considera una reseña corta con rating extremo
+SHORT_TEXT = 50
+EXTREME_RATINGS = (1, 5)
+
+_lock = threading.Lock()
+_load_done = threading.Condition(_lock)
+_loaded = False
+# Análisis guardados mientras se lee el historial (None si no hay una carga en curso)
+_pending = None
+
+# usuario -> registros empaquetados
+_authors = {}
+# url del negocio -> código, y código -> usuarios con reseñas en ese negocio
+_place_codes = {}
+_place_authors = []
+
+
+def _is_short_extreme(rating: int, length: int) -> bool:
+    return rating in EXTREME_RATINGS and length < SHORT_TEXT
+
+
+def timestamp(value) -> int:
+    """Segundos desde epoch de un ISO (o ahora si no se puede leer)."""
+    try:
+        return int(datetime.fromisoformat(value).timestamp())
+    except (TypeError, ValueError):
+        return int(time.time())
+
+
+def _place_code(url: str) -> int:
+    code = _place_codes.get(url)
+    if code is None:
+        code = len(_place_authors)
+        _place_codes[url] = code
+        _place_authors.append([])
+    return code
+
+
+def _records(data: bytearray):
+    return _RECORD.iter_unpack(data)
+
+
+def _remove_place(code: int) -> dict:
+    """
+    Quita las reseñas de un negocio del índice.
+    Retorna el momento de cada usuario quitado, para conservarlo al re-indexar.
+    """
+    seen_at = {}
+    for author in set(_place_authors[code]):
+        data = _authors.get(author)
+        if data is None:
+            continue
+        kept = bytearray()
+        for record in _records(data):
+            if record[0] == code:
+                seen_at[author] = record[1]
+            else:
+                kept += _RECORD.pack(*record)
+        if kept:
+            _authors[author] = kept
+        else:
+            del _authors[author]
+    _place_authors[code] = []
+    return seen_at
+
+
+def _index(business: dict):
+    """Agrega (o reemplaza) las reseñas de un negocio."""
+    code = _place_code(business.get("url", ""))
+    seen_at = _remove_place(code)
+    default_time = timestamp(business.get("analyzed_at"))
+
+    authors = []
+    for review in business.get("reviews", []):
+        author = sys.intern(normalize_author(review.get("author")))
+        if not author:
+            continue
+        record = _RECORD.pack(
+            code,
+            review.get("first_seen") or seen_at.get(author, default_time),
+            min(max(int(review.get("rating", 0) or 0), 0), 5),
+            min(len(review.get("text") or ""), 0xFFFF),
+        )
+        data = _authors.setdefault(author, bytearray())
+        data += record
+        if len(data) > MAX_PER_AUTHOR * _RECORD.size:
+            del data[:_RECORD.size]
+        authors.append(author)
+    _place_authors[code] = authors
+
+
+def start_loading():
+    """
+    Anuncia que otro hilo va a leer el historial para cargar el índice (ver finish_loading).
+    Mientras tanto los análisis nuevos quedan en espera y ensure_loaded espera a esa carga.
+    """
+    global _pending
+    with _lock:
+        if not _loaded and _pending is None:
+            _pending = []
+
+
+def finish_loading(analyses: Optional[list]):
+    """
+    Carga el índice con el historial ya leído (None si la lectura falló)
+    y aplica los análisis guardados mientras tanto.
+    """
+    global _loaded, _pending
+    with _lock:
+        if not _loaded and analyses is not None:
+            for business in analyses:
+                _index(business)
+            for business in _pending or []:
+                _index(business)
+            _loaded = True
+        _pending = None
+        _load_done.notify_all()
+
+
+def ensure_loaded(loader: Callable[[], list]):
+    """Construye el índice desde el historial la primera vez."""
+    global _loaded
+    if _loaded:
+        return
+    with _lock:
+        while _pending is not None and not _loaded:
+            _load_done.wait()
+        if _loaded:
+            return
+        for business in loader():
+            _index(business)
+        _loaded = True
+
+
+def index_analysis(business: dict):
+    """Actualiza el índice con un análisis nuevo o re-analizado."""
+    with _lock:
+        if _loaded:
+            _index(business)
+        elif _pending is not None:
+            _pending.append(business)
+
+
+def reset():
+    """Limpia el índice (al borrar el historial)."""
+    global _loaded
+    with _lock:
+        _authors.clear()
+        _place_codes.clear()
+        _place_authors.clear()
+        _loaded = False
+
+
+def is_burst(author: str, url: str, rating: int, text: str, now: float = None) -> bool:
+    """
+    Indica si esta reseña (corta y con rating extremo) completa una ráfaga:
+    el mismo usuario dejó reseñas así en al menos BURST_PLACES negocios
+    (contando este) dentro de BURST_DAYS.
+    """
+    if not _is_short_extreme(rating, len(text or "")):
+        return False
+    data = _authors.get(normalize_author(author))
+    if not data:
+        return False
+
+    now = time.time() if now is None else now
+    since = now - BURST_DAYS * 86400
+    current = _place_codes.get(url)
+    places = {
+        place for place, seen, r, length in _records(bytes(data))
+        if place != current and seen >= since and _is_short_extreme(r, length)
+    }
+    return len(places) + 1 >= BURST_PLACES
+
+
+def get_stats() -> dict:
+    """Tamaño del índice."""
+    with _lock:
+        return {
+            "authors": len(_authors),
+            "places": len(_place_codes),
+            "records": sum(len(d) for d in _authors.values()) // _RECORD.size,
+        }
@@ -0,0 +1,153 @@
+"""
+Representación compacta de reseñas procesadas.
+Guarda las reseñas como columnas (struct-of-arrays) con códigos para
+sentimiento y clasificación, y los indicadores de bot como máscara de bits.
+Solo se convierten a diccionarios al responder o guardar.
+"""
+
+import sys
+from array import array
+
+# Códigos fijos para valores categóricos
+SENTIMENTS = ["positive", "neutral", "negative"]
+BOT_CLASSES = ["real", "suspicious", "bot"]
+SENTIMENT_CODES = {s: i for i, s in enumerate(SENTIMENTS)}
+BOT_CODES = {b: i for i, b in enumerate(BOT_CLASSES)}
+
+# Indicadores de bot: cada uno es un bit de la máscara
+INDICATORS = ["short_text", "generic_phrases", "low_confidence", "extreme_rating", "multi_place_burst"]
+INDICATOR_BITS = {name: 1 << i for i, name in enumerate(INDICATORS)}
+
+# Lista de indicadores para cada máscara posible (se comparten entre reseñas)
+_INDICATOR_LISTS = [
+    tuple(name for name in INDICATORS if mask & INDICATOR_BITS[name])
+    for mask in range(1 << len(INDICATORS))
+]
+
+
+def normalize_author(name: str) -> str:
+    """Nombre de usuario normalizado (sin mayúsculas ni espacios repetidos)."""
+    return " ".join(str(name or "").split()).casefold()
+
+
+def decode_indicators(mask: int) -> list:
+    """Convierte una máscara de bits en la lista de indicadores."""
+    return list(_INDICATOR_LISTS[mask])
+
+
+def encode_indicators(indicators: list) -> int:
+    """Convierte una lista de indicadores en máscara de bits (ignora desconocidos)."""
+    mask = 0
+    for name in indicators or []:
+        mask |= INDICATOR_BITS.get(name, 0)
+    return mask
+
+
+class ReviewBatch:
+    """Lote de reseñas procesadas guardado por columnas."""
+
+    __slots__ = (
+        "authors", "texts", "fingerprints", "ratings", "sentiments",
+        "confidences", "bot_scores", "bot_classes", "indicators", "first_seen",
+    )
+
+    def __init__(self):
+        self.authors = []
+        self.texts = []
+        self.fingerprints = []
+        self.ratings = array("b")
+        self.sentiments = array("b")
+        self.confidences = array("f")
+        self.bot_scores = array("B")
+        self.bot_classes = array("b")
+        self.indicators = array("B")
+        # Primera vez que se vio la reseña (epoch en segundos; 0 = desconocido)
+        self.first_seen = array("I")
+
+    def __len__(self) -> int:
+        return len(self.ratings)
+
+    def append(self, author: str, text: str, rating: int, sentiment: int, confidence: float,
+               bot_score: int, bot_class: int, indicators: int, fingerprint: str,
+               first_seen: int = 0):
+        """Agrega una reseña ya codificada."""
+        self.authors.append(sys.intern(author))
+        self.texts.append(text)
+        self.fingerprints.append(fingerprint)
+        self.ratings.append(rating)
+        self.sentiments.append(sentiment)
+        self.confidences.append(confidence)
+        self.bot_scores.append(bot_score)
+        self.bot_classes.append(bot_class)
+        self.indicators.append(indicators)
+        self.first_seen.append(first_seen)
+
+    def append_from(self, other: "ReviewBatch", i: int):
+        """Copia la reseña `i` de otro lote."""
+        self.append(
+            other.authors[i], other.texts[i], other.ratings[i], other.sentiments[i],
+            other.confidences[i], other.bot_scores[i], other.bot_classes[i],
+            other.indicators[i], other.fingerprints[i], other.first_seen[i],
+        )
+
+    def extend(self, other: "ReviewBatch"):
+        """Agrega todas las reseñas de otro lote."""
+        for name in self.__slots__:
+            getattr(self, name).extend(getattr(other, name))
+
+    def truncate(self, size: int):
+        """Deja solo las primeras `size` reseñas."""
+        for name in self.__slots__:
+            del getattr(self, name)[size:]
+
+    def approx_bytes(self, i: int) -> int:
+        """Tamaño aproximado de la reseña `i` guardada como documento (textos + campos fijos)."""
+        return len(self.authors[i].encode("utf-8")) + len(self.texts[i].encode("utf-8")) + 200
+
+    def counts(self, column: str, size: int) -> list:
+        """Cuenta cuántas reseñas hay de cada código en una columna."""
+        totals = [0] * size
+        for code in getattr(self, column):
+            totals[code] += 1
+        return totals
+
+    def row(self, i: int) -> dict:
+        """Reseña `i` con el formato JSON de la API."""
+        return {
+            "author": self.authors[i],
+            "text": self.texts[i],
+            "rating": self.ratings[i],
+            "sentiment": SENTIMENTS[self.sentiments[i]],
+            "confidence": round(self.confidences[i], 4),
+            "bot_score": self.bot_scores[i],
+            "bot_classification": BOT_CLASSES[self.bot_classes[i]],
+            "bot_indicators": decode_indicators(self.indicators[i]),
+            "fingerprint": self.fingerprints[i],
+            "first_seen": self.first_seen[i],
+        }
+
+    def to_dicts(self) -> list:
+        """Convierte el lote al formato JSON de la API."""
+        return [self.row(i) for i in range(len(self))]
+
+    @classmethod
+    def from_dicts(cls, reviews: list, default_first_seen: int = 0) -> "ReviewBatch":
+        """
+        Crea un lote desde reseñas en formato JSON (por ejemplo, del historial).
+        Las reseñas guardadas antes de first_seen toman `default_first_seen`.
+        """
+        batch = cls()
+        for r in reviews:
+            batch.append(
+                r.get("author", "Anónimo"),
+                r.get("text", ""),
+                min(max(int(r.get("rating", 0) or 0), 0), 5),
+                SENTIMENT_CODES.get(r.get("sentiment"), 1),
+                float(r.get("confidence", 0.5) or 0.5),
+                min(max(int(r.get("bot_score", 0) or 0), 0), 100),
+                BOT_CODES.get(r.get("bot_classification"), 0),
+                encode_indicators(r.get("bot_indicators")),
+                r.get("fingerprint", ""),
+                int(r.get("first_seen", 0) or default_first_seen),
+            )
+        return batch
@@ -0,0 +1,503 @@
+"""
+Búsqueda de texto completo sobre las reseñas guardadas.
+Índice invertido con tokenización en español sin acentos y ranking BM25.
+Se actualiza incrementalmente con cada análisis. Con el historial en JSON local
+se persiste junto a él (una foto completa más un diario de cambios que se
+reaplica al cargar). Con Firestore no se guarda en disco: el disco de la
+instancia no es persistente y no vería los análisis de otras instancias, así
+que se reconstruye desde el historial al arrancar.
+Las fotos se escriben en un hilo aparte, fuera del pedido que las dispara.
+"""
+
+import html
+import json
+import os
+import pickle
+import re
+import threading
+import unicodedata
+from array import array
+from typing import Callable, Optional
+
+import numpy as np
+
+import storage
+from reviews import SENTIMENTS, BOT_CLASSES, SENTIMENT_CODES, BOT_CODES
+
+# Archivos del índice (junto a analysis_history.json)
+INDEX_FILE = os.path.join(os.path.dirname(__file__), "search_index.pkl")
+JOURNAL_FILE = os.path.join(os.path.dirname(__file__), "search_index.journal")
+
+# Cada cuántos cambios se reescribe la foto completa del índice
+SNAPSHOT_EVERY = 200
+
+# Parámetros de BM25
+K1 = 1.2
+B = 0.75
+
+SNIPPET_CHARS = 160
+
+STOPWORDS = {
+    "de", "la", "que", "el", "en", "y", "a", "los", "se", "del", "las", "un",
+    "por", "con", "no", "una", "su", "para", "es", "al", "lo", "como", "mas",
+    "o", "pero", "sus", "le", "ha", "me", "si", "sin", "sobre", "este", "ya",
+    "muy", "fue", "son", "mi", "hay", "les", "nos", "te", "yo", "ni", "esta",
+}
+
+_TOKEN_RE = re.compile(r"\w+")
+
+_lock = threading.Lock()
+_load_done = threading.Condition(_lock)
+_loaded = False
+# Análisis guardados mientras se lee el historial (None si no hay una carga en curso)
+_pending = None
+# Si el índice se guarda en disco (solo con el historial en JSON local)
+_persist = True
+_journal_entries = 0
+_snapshot_pending = False
+_state = {}
+
+
+def _empty_state() -> dict:
+    """Estado vacío del índice."""
+    return {
+        # Listas de postings por término: ids de documento y frecuencias
+        "postings": {},
+        # Reseñas vigentes por término (los postings incluyen las eliminadas)
+        "df": {},
+        # Columnas por documento (reseña)
+        "doc_business": array("I"),
+        "doc_length": array("I"),
+        "doc_category": array("h"),
+        "doc_sentiment": array("b"),
+        "doc_bot": array("b"),
+        "doc_alive": array("b"),
+        "doc_author": [],
+        "doc_text": [],
+        "doc_rating": array("b"),
+        # Negocios indexados
+        "business_urls": [],
+        "business_names": [],
+        "business_codes": {},
+        "business_docs": {},
+        "categories": [],
+        "category_codes": {},
+        "alive_docs": 0,
+        "alive_length": 0,
+    }
+
+
+class _FoldTable(dict):
+    """Tabla para str.translate que calcula y recuerda cada carácter una sola vez."""
+
+    _cache = {}
+
+    def __getitem__(self, code: int) -> str:
+        if code not in self._cache:
+            char = chr(code)
+            base = unicodedata.normalize("NFKD", char)[:1] or char
+            lower = base.lower()
+            self._cache[code] = lower if len(lower) == 1 else base
+        return self._cache[code]
+
+
+def fold(text: str) -> str:
+    """
+    Pasa a minúsculas y quita acentos carácter por carácter.
+    Conserva la longitud para que las posiciones sirvan en el texto original.
+    """
+    return text.translate(_FoldTable())
+
+
+def tokenize(text: str) -> list:
+    """Tokeniza un texto en español: minúsculas, sin acentos ni stopwords."""
+    return [t for t in _TOKEN_RE.findall(fold(text)) if len(t) > 1 and t not in STOPWORDS]
+
+
+def _code(codes: dict, keys: list, value: str) -> int:
+    """Obtiene (o crea) el código de un valor categórico."""
+    if value not in codes:
+        codes[value] = len(keys)
+        keys.append(value)
+    return codes[value]
+
+
+def _remove_business(url: str):
+    """Marca como eliminadas las reseñas previas de un negocio (sin lock)."""
+    for doc_id in _state["business_docs"].pop(url, []):
+        if _state["doc_alive"][doc_id]:
+            _state["doc_alive"][doc_id] = 0
+            _state["alive_docs"] -= 1
+            _state["alive_length"] -= _state["doc_length"][doc_id]
+            for token in set(tokenize(_state["doc_text"][doc_id])):
+                _state["df"][token] -= 1
+            # Liberar el texto; los postings se filtran por doc_alive
+            _state["doc_text"][doc_id] = ""
+            _state["doc_author"][doc_id] = ""
+
+
+def _index_business(business: dict):
+    """Indexa las reseñas de un negocio, reemplazando las anteriores (sin lock)."""
+    url = business.get("url", "")
+    _remove_business(url)
+
+    business_code = _code(_state["business_codes"], _state["business_urls"], url)
+    if business_code == len(_state["business_names"]):
+        _state["business_names"].append(business.get("name", ""))
+    else:
+        _state["business_names"][business_code] = business.get("name", "")
+
+    category_id = business.get("category", {}).get("category_id", "otros")
+    category_code = _code(_state["category_codes"], _state["categories"], category_id)
+
+    postings = _state["postings"]
+    doc_ids = []
+    for review in business.get("reviews", []):
+        text = review.get("text", "") or ""
+        tokens = tokenize(text)
+
+        doc_id = len(_state["doc_length"])
+        doc_ids.append(doc_id)
+        _state["doc_business"].append(business_code)
+        _state["doc_length"].append(len(tokens))
+        _state["doc_category"].append(category_code)
+        _state["doc_sentiment"].append(SENTIMENT_CODES.get(review.get("sentiment"), 1))
+        _state["doc_bot"].append(BOT_CODES.get(review.get("bot_classification"), 0))
+        _state["doc_alive"].append(1)
+        _state["doc_author"].append(review.get("author", ""))
+        _state["doc_text"].append(text)
+        _state["doc_rating"].append(int(review.get("rating", 0) or 0))
+        _state["alive_docs"] += 1
+        _state["alive_length"] += len(tokens)
+
+        frequencies = {}
+        for token in tokens:
+            frequencies[token] = frequencies.get(token, 0) + 1
+        for token, tf in frequencies.items():
+            if token not in postings:
+                postings[token] = (array("I"), array("I"))
+            postings[token][0].append(doc_id)
+            postings[token][1].append(tf)
+            _state["df"][token] = _state["df"].get(token, 0) + 1
+
+    _state["business_docs"][url] = doc_ids
+
+
+def _compact():
+    """Reconstruye el índice solo con las reseñas vigentes (sin lock)."""
+    global _state
+    old = _state
+    _state = _empty_state()
+    for url, doc_ids in old["business_docs"].items():
+        business_code = old["business_codes"][url]
+        if not doc_ids:
+            continue
+        _index_business({
+            "url": url,
+            "name": old["business_names"][business_code],
+            "category": {"category_id": old["categories"][old["doc_category"][doc_ids[0]]]},
+            "reviews": [
+                {
+                    "author": old["doc_author"][d],
+                    "text": old["doc_text"][d],
+                    "rating": old["doc_rating"][d],
+                    "sentiment": SENTIMENTS[old["doc_sentiment"][d]],
+                    "bot_classification": BOT_CLASSES[old["doc_bot"][d]],
+                }
+                for d in doc_ids
+            ],
+        })
+
+
+def _save_snapshot():
+    """Escribe la foto completa del índice y vacía el diario (sin lock)."""
+    global _journal_entries
+    if not _persist:
+        return
+    try:
+        tmp_file = INDEX_FILE + ".tmp"
+        with open(tmp_file, "wb") as f:
+            pickle.dump(_state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, INDEX_FILE)
+        if os.path.exists(JOURNAL_FILE):
+            os.remove(JOURNAL_FILE)
+        _journal_entries = 0
+    except IOError as e:
+        print(f"⚠️ No se pudo guardar el índice de búsqueda: {e}")
+
+
+def _append_journal(business: dict):
+    """Agrega un negocio al diario de cambios (sin lock)."""
+    global _journal_entries
+    if not _persist:
+        return
+    entry = {
+        "url": business.get("url", ""),
+        "name": business.get("name", ""),
+        "category": business.get("category", {}),
+        "reviews": [
+            {k: r.get(k) for k in ("author", "text", "rating", "sentiment", "bot_classification")}
+            for r in business.get("reviews", [])
+        ],
+    }
+    try:
+        with open(JOURNAL_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        _journal_entries += 1
+    except IOError as e:
+        print(f"⚠️ No se pudo escribir el diario de búsqueda: {e}")
+
+
+def _load_from_disk() -> bool:
+    """Carga la foto y reaplica el diario. Retorna False si no hay índice guardado."""
+    global _state, _journal_entries
+    if not os.path.exists(INDEX_FILE) and not os.path.exists(JOURNAL_FILE):
+        return False
+
+    _state = _empty_state()
+    if os.path.exists(INDEX_FILE):
+        try:
+            with open(INDEX_FILE, "rb") as f:
+                _state = pickle.load(f)
+        except (IOError, pickle.UnpicklingError, EOFError):
+            return False
+        if "df" not in _state:
+            # Foto anterior al conteo de vigentes: calcularlo desde los postings
+            alive = _state["doc_alive"]
+            _state["df"] = {
+                term: sum(1 for d in doc_ids if alive[d])
+                for term, (doc_ids, _) in _state["postings"].items()
+            }
+
+    _journal_entries = 0
+    if os.path.exists(JOURNAL_FILE):
+        with open(JOURNAL_FILE, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    _index_business(json.loads(line))
+                    _journal_entries += 1
+                except json.JSONDecodeError:
+                    continue
+    return True
+
+
+def _write_snapshot(compact: bool):
+    """Hilo de fondo: compacta si hace falta y escribe la foto (con lock)."""
+    global _snapshot_pending
+    with _lock:
+        _snapshot_pending = False
+        if not _loaded:
+            return
+        if compact:
+            _compact()
+        _save_snapshot()
+
+
+def _schedule_snapshot(compact: bool = False):
+    """Pide una foto (y compactación) en segundo plano (sin lock)."""
+    global _snapshot_pending
+    if _snapshot_pending:
+        return
+    _snapshot_pending = True
+    threading.Thread(target=_write_snapshot, args=(compact,), daemon=True).start()
+
+
+def _load(loader: Callable[[], list]):
+    """Carga la foto del disco o construye el índice desde el historial (sin lock)."""
+    global _state, _persist
+    _persist = storage.backend_name() != "firestore"
+    if not _persist or not _load_from_disk():
+        print("🔎 Construyendo índice de búsqueda desde el historial...")
+        _state = _empty_state()
+        for business in loader():
+            _index_business(business)
+        _save_snapshot()
+
+
+def start_loading():
+    """
+    Anuncia que otro hilo va a leer el historial para cargar el índice (ver finish_loading).
+    Mientras tanto los análisis nuevos quedan en espera y ensure_loaded espera a esa carga.
+    """
+    global _pending
+    with _lock:
+        if not _loaded and _pending is None:
+            _pending = []
+
+
+def finish_loading(analyses: Optional[list]):
+    """
+    Carga el índice con el historial ya leído (None si la lectura falló)
+    y aplica los análisis guardados mientras tanto.
+    """
+    global _loaded, _pending
+    with _lock:
+        if not _loaded and analyses is not None:
+            _load(lambda: analyses)
+            for business in _pending or []:
+                _apply(business)
+            _loaded = True
+        _pending = None
+        _load_done.notify_all()
+
+
+def ensure_loaded(loader: Callable[[], list]):
+    """Carga el índice la primera vez; si no existe, lo construye desde el historial."""
+    global _loaded
+    if _loaded:
+        return
+    with _lock:
+        while _pending is not None and not _loaded:
+            _load_done.wait()
+        if _loaded:
+            return
+        _load(loader)
+        _loaded = True
+
+
+def index_analysis(business: dict):
+    """Actualiza el índice con un análisis nuevo o re-analizado."""
+    with _lock:
+        if _loaded:
+            _apply(business)
+        elif _pending is not None:
+            _pending.append(business)
+
+
+def _apply(business: dict):
+    """Indexa un análisis, lo anota en el diario y pide una foto si hace falta (sin lock)."""
+    _index_business(business)
+    _append_journal(business)
+    dead_docs = len(_state["doc_length"]) - _state["alive_docs"]
+    if dead_docs > max(_state["alive_docs"], 1000):
+        # Demasiadas reseñas reemplazadas: reconstruir y guardar foto
+        _schedule_snapshot(compact=True)
+    elif _persist and _journal_entries >= SNAPSHOT_EVERY:
+        _schedule_snapshot()
+
+
+def reset():
+    """Borra el índice en memoria y en disco (al limpiar el historial)."""
+    global _loaded, _state, _journal_entries
+    with _lock:
+        _state = _empty_state()
+        _journal_entries = 0
+        _loaded = False
+        for path in (INDEX_FILE, JOURNAL_FILE):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _column(values: array, dtype) -> np.ndarray:
+    """Copia una columna a NumPy (una vista bloquearía el crecimiento del array)."""
+    return np.frombuffer(values, dtype=dtype).copy()
+
+
+def _snippet(text: str, terms: set) -> str:
+    """Fragmento del texto alrededor de la primera coincidencia, con <mark>."""
+    folded = fold(text)
+    spans = [m.span() for m in _TOKEN_RE.finditer(folded) if m.group() in terms]
+    if not spans:
+        end = min(len(text), SNIPPET_CHARS)
+        return html.escape(text[:end]) + ("…" if end < len(text) else "")
+
+    start = max(0, spans[0][0] - SNIPPET_CHARS // 4)
+    end = min(len(text), start + SNIPPET_CHARS)
+
+    parts = ["…" if start > 0 else ""]
+    cursor = start
+    for s, e in spans:
+        if s < cursor or e > end:
+            continue
+        parts.append(html.escape(text[cursor:s]))
+        parts.append(f"<mark>{html.escape(text[s:e])}</mark>")
+        cursor = e
+    parts.append(html.escape(text[cursor:end]))
+    parts.append("…" if end < len(text) else "")
+    return "".join(parts)
+
+
+def search(query: str, category: Optional[str] = None, sentiment: Optional[str] = None,
+           bot_classification: Optional[str] = None, page: int = 1, page_size: int = 20) -> dict:
+    """
+    Busca reseñas por texto y las ordena por BM25.
+
+    Returns:
+        dict con total de coincidencias y la página de resultados con snippets
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    empty = {"query": query, "total": 0, "page": page, "page_size": page_size, "results": []}
+    if not terms:
+        return empty
+
+    with _lock:
+        n_docs = len(_state["doc_length"])
+        alive_docs = _state["alive_docs"]
+        if n_docs == 0 or alive_docs == 0:
+            return empty
+
+        avg_length = _state["alive_length"] / alive_docs
+        lengths = _column(_state["doc_length"], np.uint32).astype(np.float32)
+        scores = np.zeros(n_docs, dtype=np.float32)
+
+        for term in terms:
+            df = _state["df"].get(term, 0)
+            if df == 0:
+                continue
+            doc_ids_raw, tfs_raw = _state["postings"][term]
+            doc_ids = _column(doc_ids_raw, np.uint32)
+            tfs = _column(tfs_raw, np.uint32).astype(np.float32)
+            idf = np.log(1 + (alive_docs - df + 0.5) / (df + 0.5))
+            norm = K1 * (1 - B + B * lengths[doc_ids] / avg_length)
+            scores[doc_ids] += idf * tfs * (K1 + 1) / (tfs + norm)
+
+        # Filtros
+        mask = (scores > 0) & (_column(_state["doc_alive"], np.int8) == 1)
+        if category:
+            code = _state["category_codes"].get(category, -1)
+            mask &= _column(_state["doc_category"], np.int16) == code
+        if sentiment:
+            mask &= _column(_state["doc_sentiment"], np.int8) == SENTIMENT_CODES.get(sentiment, -1)
+        if bot_classification:
+            mask &= _column(_state["doc_bot"], np.int8) == BOT_CODES.get(bot_classification, -1)
+
+        hits = np.flatnonzero(mask)
+        total = len(hits)
+
+        # Solo ordenar lo necesario para la página pedida
+        offset = (page - 1) * page_size
+        needed = min(offset + page_size, total)
+        if needed <= 0 or offset >= total:
+            top = np.array([], dtype=np.int64)
+        else:
+            hit_scores = scores[hits]
+            if needed < total:
+                partial = np.argpartition(-hit_scores, needed - 1)[:needed]
+            else:
+                partial = np.arange(total)
+            ordered = partial[np.argsort(-hit_scores[partial], kind="stable")]
+            top = hits[ordered[offset:needed]]
+
+        results = []
+        term_set = set(terms)
+        for doc_id in top:
+            business_code = _state["doc_business"][doc_id]
+            results.append({
+                "business_name": _state["business_names"][business_code],
+                "url": _state["business_urls"][business_code],
+                "category_id": _state["categories"][_state["doc_category"][doc_id]],
+                "author": _state["doc_author"][doc_id],
+                "rating": _state["doc_rating"][doc_id],
+                "sentiment": SENTIMENTS[_state["doc_sentiment"][doc_id]],
+                "bot_classification": BOT_CLASSES[_state["doc_bot"][doc_id]],
+                "score": round(float(scores[doc_id]), 4),
+                "snippet": _snippet(_state["doc_text"][doc_id], term_set),
+            })
+
+    return {
+        "query": query,
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "results": results,
+    }
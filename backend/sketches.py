@@ -0,0 +1,308 @@
+"""
+Sketches probabilísticos para agregados del historial.
+Cada negocio y cada rubro guarda un resumen de tamaño fijo:
+- HyperLogLog para autores distintos.
+- KLL para cuantiles de confianza y de largo del texto.
+- Histograma exacto de ratings.
+Los sketches se combinan (merge) sin volver a leer las reseñas, así
+juntar rubros cuesta lo mismo que el tamaño del sketch. Se guardan como
+bytes en base64 para que ocupen poco en el JSON y en Firestore.
+"""
+
+import base64
+import hashlib
+import math
+import random
+import struct
+from array import array
+from typing import Optional
+
+from reviews import normalize_author
+
+# HyperLogLog: 2^12 registros, error estándar 1.04 / sqrt(4096) ≈ 1.6%
+HLL_PRECISION = 12
+
+# KLL: tamaño del compactor más alto (error de rango ≈ 1.3% con k=200)
+KLL_K = 200
+
+# Cuantiles que se reportan en /stats
+QUANTILES = [0.1, 0.25, 0.5, 0.75, 0.9]
+
+_random = random.Random(2026)
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii")
+
+
+def _unb64(text: str) -> bytes:
+    return base64.b64decode(text) if text else b""
+
+
+class HyperLogLog:
+    """Estimador de cardinalidad (autores distintos)."""
+
+    __slots__ = ("registers",)
+
+    def __init__(self, registers: Optional[bytearray] = None):
+        self.registers = registers if registers is not None else bytearray(1 << HLL_PRECISION)
+
+    def add(self, value: str):
+        h = int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+        index = h >> (64 - HLL_PRECISION)
+        rest = h & ((1 << (64 - HLL_PRECISION)) - 1)
+        rank = (64 - HLL_PRECISION) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def estimate(self) -> float:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            # Rango chico: conteo lineal
+            return m * math.log(m / zeros)
+        return raw
+
+    @staticmethod
+    def relative_error() -> float:
+        return 1.04 / math.sqrt(1 << HLL_PRECISION)
+
+    def to_bytes(self) -> bytes:
+        """Formato ralo (índice, rango) si hay pocos registros usados; si no, denso."""
+        used = [i for i, r in enumerate(self.registers) if r]
+        if len(used) * 3 < len(self.registers):
+            indexes = array("H", used)
+            ranks = bytes(self.registers[i] for i in used)
+            return b"S" + indexes.tobytes() + ranks
+        return b"D" + bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        hll = cls()
+        if not data:
+            return hll
+        if data[:1] == b"D":
+            hll.registers = bytearray(data[1:])
+            return hll
+        count = (len(data) - 1) // 3
+        indexes = array("H")
+        indexes.frombytes(data[1:1 + 2 * count])
+        for i, rank in zip(indexes, data[1 + 2 * count:]):
+            hll.registers[i] = rank
+        return hll
+
+
+class KLLSketch:
+    """Sketch de cuantiles KLL (compactores con capacidad decreciente hacia abajo)."""
+
+    __slots__ = ("k", "n", "levels")
+
+    def __init__(self, k: int = KLL_K):
+        self.k = k
+        self.n = 0
+        self.levels = [[]]
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def _size(self) -> int:
+        return sum(len(items) for items in self.levels)
+
+    def _max_size(self) -> int:
+        return sum(self._capacity(h) for h in range(len(self.levels)))
+
+    def add(self, value: float):
+        self.levels[0].append(float(value))
+        self.n += 1
+        if len(self.levels[0]) >= self._capacity(0):
+            self._compress()
+
+    def _compress(self):
+        """Compacta niveles llenos: la mitad de sus elementos sube con peso doble."""
+        while self._size() >= self._max_size():
+            for h, items in enumerate(self.levels):
+                if len(items) >= self._capacity(h):
+                    if h + 1 == len(self.levels):
+                        self.levels.append([])
+                    items.sort()
+                    # Si es impar, el último queda en el nivel
+                    keep = [items.pop()] if len(items) % 2 else []
+                    offset = _random.randint(0, 1)
+                    self.levels[h + 1].extend(items[offset::2])
+                    self.levels[h] = keep
+                    break
+            else:
+                return
+
+    def merge(self, other: "KLLSketch"):
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for h, items in enumerate(other.levels):
+            self.levels[h].extend(items)
+        self.n += other.n
+        self._compress()
+
+    def quantile(self, q: float) -> Optional[float]:
+        weighted = sorted(
+            (value, 1 << h) for h, items in enumerate(self.levels) for value in items
+        )
+        if not weighted:
+            return None
+        target = q * sum(w for _, w in weighted)
+        cumulative = 0
+        for value, weight in weighted:
+            cumulative += weight
+            if cumulative >= target:
+                return value
+        return weighted[-1][0]
+
+    def rank_error(self) -> float:
+        """
+        Error de rango normalizado (99% de confianza, fórmula empírica de DataSketches).
+        Mientras nada se compactó, los cuantiles son exactos.
+        """
+        if len(self.levels) == 1:
+            return 0.0
+        return 2.296 / self.k ** 0.9723
+
+    def to_bytes(self) -> bytes:
+        header = struct.pack("<HIB", self.k, self.n, len(self.levels))
+        counts = array("I", (len(items) for items in self.levels))
+        values = array("f", (v for items in self.levels for v in items))
+        return header + counts.tobytes() + values.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "KLLSketch":
+        if not data:
+            return cls()
+        k, n, depth = struct.unpack_from("<HIB", data)
+        sketch = cls(k)
+        sketch.n = n
+        offset = struct.calcsize("<HIB")
+        counts = array("I")
+        counts.frombytes(data[offset:offset + 4 * depth])
+        values = array("f")
+        values.frombytes(data[offset + 4 * depth:])
+        sketch.levels = []
+        start = 0
+        for count in counts:
+            sketch.levels.append(list(values[start:start + count]))
+            start += count
+        return sketch
+
+
+# ============== SKETCHES DE NEGOCIOS Y RUBROS ==============
+
+def from_reviews(reviews: list) -> dict:
+    """Sketches (serializados) de una lista de reseñas en formato JSON."""
+    authors = HyperLogLog()
+    confidence = KLLSketch()
+    text_length = KLLSketch()
+    ratings = [0] * 6
+    for review in reviews:
+        authors.add(normalize_author(review.get("author")))
+        confidence.add(review.get("confidence", 0.5) or 0.5)
+        text_length.add(len(review.get("text") or ""))
+        ratings[min(max(int(review.get("rating", 0) or 0), 0), 5)] += 1
+    return {
+        "reviews": len(reviews),
+        "authors": _b64(authors.to_bytes()),
+        "confidence": _b64(confidence.to_bytes()),
+        "text_length": _b64(text_length.to_bytes()),
+        "ratings": ratings,
+    }
+
+
+def of_business(business: dict) -> dict:
+    """Sketches guardados de un negocio (los calcula si es un análisis antiguo)."""
+    return business.get("sketches") or from_reviews(business.get("reviews", []))
+
+
+def merge(sketches: list) -> dict:
+    """Combina varios sketches serializados en uno."""
+    authors = HyperLogLog()
+    confidence = KLLSketch()
+    text_length = KLLSketch()
+    ratings = [0] * 6
+    total = 0
+    for sketch in sketches:
+        if not sketch:
+            continue
+        total += sketch.get("reviews", 0)
+        authors.merge(HyperLogLog.from_bytes(_unb64(sketch.get("authors"))))
+        confidence.merge(KLLSketch.from_bytes(_unb64(sketch.get("confidence"))))
+        text_length.merge(KLLSketch.from_bytes(_unb64(sketch.get("text_length"))))
+        ratings = [a + b for a, b in zip(ratings, sketch.get("ratings", [0] * 6))]
+    return {
+        "reviews": total,
+        "authors": _b64(authors.to_bytes()),
+        "confidence": _b64(confidence.to_bytes()),
+        "text_length": _b64(text_length.to_bytes()),
+        "ratings": ratings,
+    }
+
+
+def category_update(category_sketch: Optional[dict], business: dict,
+                    previous: Optional[dict] = None) -> Optional[dict]:
+    """
+    Nuevo sketch del rubro tras guardar `business` (que reemplaza a `previous`).
+    Solo se suman las reseñas nuevas; el HyperLogLog admite volver a sumar autores.
+    Los sketches no permiten restar: si el análisis dejó afuera reseñas que estaban
+    en `previous` (tope de guardado), se recalcula para coincidir con la reconstrucción.
+    Retorna None si no se puede actualizar de forma incremental (hay que recalcular).
+    """
+    if previous is None:
+        return merge([category_sketch, business["sketches"]])
+
+    same_category = (
+        previous.get("category", {}).get("category_id")
+        == business.get("category", {}).get("category_id")
+    )
+    previous_reviews = previous.get("reviews", [])
+    if not same_category or not all(r.get("fingerprint") for r in previous_reviews):
+        return None
+
+    known = {r["fingerprint"] for r in previous_reviews}
+    current = {r.get("fingerprint") for r in business.get("reviews", [])}
+    if not known <= current:
+        return None
+    added = [r for r in business.get("reviews", []) if r.get("fingerprint") not in known]
+    delta = from_reviews(added)
+    delta["authors"] = business["sketches"]["authors"]
+    return merge([category_sketch, delta])
+
+
+def summarize(sketch: Optional[dict]) -> dict:
+    """Estimaciones con sus cotas de error para /stats."""
+    sketch = sketch or from_reviews([])
+    authors = HyperLogLog.from_bytes(_unb64(sketch.get("authors")))
+    estimate = authors.estimate()
+    error = HyperLogLog.relative_error()
+
+    def quantiles(encoded: str, digits: int) -> dict:
+        kll = KLLSketch.from_bytes(_unb64(encoded))
+        values = {}
+        for q in QUANTILES:
+            value = kll.quantile(q)
+            values[f"p{int(q * 100)}"] = round(value, digits) if value is not None else None
+        return {"quantiles": values, "rank_error": round(kll.rank_error(), 4)}
+
+    return {
+        "reviews": sketch.get("reviews", 0),
+        "distinct_authors": {
+            "estimate": round(estimate),
+            "relative_error": round(error, 4),
+            # Intervalo de ~95% (dos errores estándar)
+            "low": math.floor(estimate * (1 - 2 * error)),
+            "high": math.ceil(estimate * (1 + 2 * error)),
+        },
+        "confidence": quantiles(sketch.get("confidence"), 4),
+        "text_length": quantiles(sketch.get("text_length"), 0),
+        "rating_distribution": {str(r): c for r, c in enumerate(sketch.get("ratings", [0] * 6))},
+    }
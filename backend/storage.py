@@ -0,0 +1,159 @@
+"""
+Selección del backend de historial (Firestore o JSON local).
+La elección y la conexión a Firebase corren en segundo plano al arrancar,
+así el servidor responde /health de inmediato. Las consultas al historial
+esperan a que el backend esté listo (hasta STORAGE_READY_TIMEOUT segundos).
+"""
+
+import asyncio
+import importlib.util
+import os
+import threading
+import time
+from typing import Optional
+
+from fastapi import HTTPException
+
+import firebase_config
+
+# Cuánto puede esperar una consulta a que el historial esté listo
+READY_TIMEOUT = float(os.environ.get("STORAGE_READY_TIMEOUT", "15"))
+
+_ready = threading.Event()
+_start_lock = threading.Lock()
+_thread = None
+_backend = None
+_backend_name = None
+_started_at = time.monotonic()
+_ready_after = None
+
+
+def _select_backend():
+    """Elige el backend y, si es Firestore, inicializa el cliente."""
+    global _backend, _backend_name, _ready_after
+
+    # Usar Firestore si está instalado y hay credenciales;
+    # fallback a history local si Firestore no está configurado
+    if importlib.util.find_spec("firebase_admin") and firebase_config.has_credentials():
+        import history_firestore as backend
+        name = "firestore"
+        # Precalentar: importa firebase_admin y conecta (con backoff si falla)
+        firebase_config.get_firestore_client()
+        # Con FIRESTORE_MIRROR=1, empezar a cargar el espejo en memoria
+        backend.start_mirror()
+        print("📦 Usando Firestore para historial")
+    else:
+        import history as backend
+        name = "json"
+        print("📦 Usando JSON local para historial")
+
+    _backend = backend
+    _backend_name = name
+    _ready_after = time.monotonic() - _started_at
+    _ready.set()
+
+
+def start():
+    """Inicia la selección del backend en segundo plano (una sola vez)."""
+    global _started_at, _thread
+    with _start_lock:
+        if _thread is not None:
+            return
+        _started_at = time.monotonic()
+        _thread = threading.Thread(target=_select_backend, daemon=True)
+        _thread.start()
+
+
+def is_ready() -> bool:
+    """Indica si el backend de historial ya está listo."""
+    return _ready.is_set()
+
+
+def status() -> dict:
+    """Estado del backend para /health."""
+    status = {"ready": _ready.is_set(), "backend": _backend_name}
+    if _ready_after is not None:
+        status["ready_after_seconds"] = round(_ready_after, 3)
+    if _backend_name == "firestore":
+        status["firestore_connected"] = firebase_config._db is not None
+        mirror = _backend.get_mirror_status()
+        if mirror is not None:
+            status["mirror"] = mirror
+    return status
+
+
+async def wait_ready():
+    """Dependencia para endpoints: espera el backend sin bloquear el servidor (503 si no llega)."""
+    if _ready.is_set():
+        return
+    start()
+    await asyncio.to_thread(_ready.wait, READY_TIMEOUT)
+    if not _ready.is_set():
+        raise HTTPException(
+            status_code=503,
+            detail="El historial todavía se está inicializando. Intenta de nuevo.",
+            headers={"Retry-After": "5"}
+        )
+
+
+def backend():
+    """Retorna el módulo de historial activo (espera si aún no está listo)."""
+    if not _ready.is_set():
+        start()
+        if not _ready.wait(READY_TIMEOUT):
+            raise RuntimeError("El historial todavía se está inicializando")
+    return _backend
+
+
+def backend_name() -> str:
+    """Nombre del backend activo: "firestore" o "json" (espera si aún no está listo)."""
+    backend()
+    return _backend_name
+
+
+# ============== FUNCIONES DEL HISTORIAL ==============
+
+def add_analysis(business_data: dict) -> dict:
+    """Agrega o actualiza un análisis en el historial activo."""
+    return backend().add_analysis(business_data)
+
+
+def get_all_analyses() -> list:
+    """Obtiene todos los análisis del historial activo."""
+    return backend().get_all_analyses()
+
+
+def iter_analyses(category_id: Optional[str] = None, since: Optional[str] = None,
+                  until: Optional[str] = None):
+    """Recorre los análisis de a uno (sin cargar todo en memoria)."""
+    return backend().iter_analyses(category_id, since, until)
+
+
+def get_analyses_by_category(category_id: str) -> list:
+    """Obtiene análisis filtrados por categoría."""
+    return backend().get_analyses_by_category(category_id)
+
+
+def get_analysis_by_url(url: str):
+    """Obtiene un análisis específico por URL."""
+    return backend().get_analysis_by_url(url)
+
+
+def get_category_stats() -> dict:
+    """Obtiene estadísticas agregadas por categoría."""
+    return backend().get_category_stats()
+
+
+def get_category_sketches() -> dict:
+    """Obtiene los sketches serializados por rubro."""
+    return backend().get_category_sketches()
+
+
+def get_changes(since: Optional[str] = None) -> dict:
+    """Obtiene los cambios del historial después del cursor."""
+    return backend().get_changes(since)
+
+
+def clear_history() -> bool:
+    """Limpia todo el historial."""
+    return backend().clear_history()
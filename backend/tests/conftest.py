@@ -0,0 +1,6 @@
+"""Configuración de pytest: los módulos del backend se importan por nombre."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
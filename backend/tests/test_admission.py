@@ -0,0 +1,49 @@
+"""Pruebas de la identificación de clientes y del control de admisión."""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+import admission
+
+
+def _request(headers: dict, host: str = "10.0.0.1") -> Request:
+    return Request({
+        "type": "http",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+        "client": (host, 1234),
+    })
+
+
+def test_unknown_api_key_is_ignored(monkeypatch):
+    monkeypatch.setattr(admission, "API_KEYS", {"secreta"})
+    assert admission.client_key(_request({"X-API-Key": "inventada"})) == "ip:10.0.0.1"
+    assert admission.client_key(_request({"X-API-Key": "secreta"})) == "key:secreta"
+
+
+def test_forwarded_for_uses_last_hop(monkeypatch):
+    monkeypatch.setattr(admission, "TRUST_PROXY", True)
+    request = _request({"X-Forwarded-For": "1.2.3.4, 203.0.113.9"})
+    assert admission.client_key(request) == "ip:203.0.113.9"
+
+
+def test_forwarded_for_is_ignored_without_proxy(monkeypatch):
+    monkeypatch.setattr(admission, "TRUST_PROXY", False)
+    request = _request({"X-Forwarded-For": "1.2.3.4, 203.0.113.9"})
+    assert admission.client_key(request) == "ip:10.0.0.1"
+
+
+def test_queue_full_does_not_charge_a_token(monkeypatch):
+    monkeypatch.setattr(admission, "_buckets", admission.OrderedDict())
+    monkeypatch.setattr(admission, "_active", admission.MAX_CONCURRENT + admission.MAX_QUEUE)
+
+    async def analyze():
+        async with admission.admit("ip:10.0.0.1"):
+            pass
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(analyze())
+    assert error.value.detail.startswith("El servidor está ocupado")
+    assert "ip:10.0.0.1" not in admission._buckets
@@ -0,0 +1,69 @@
+"""Pruebas del motor de analítica columnar."""
+
+import random
+
+import pytest
+
+import analytics
+
+
+def _business(rng: random.Random, i: int) -> dict:
+    return {
+        "url": f"https://maps/place/{i}",
+        "name": f"Negocio {i}",
+        "category": {"category_id": rng.choice(["salud", "banca", "comida"])},
+        "analyzed_at": "2026-10-01T12:00:00",
+        "reviews": [
+            {
+                "rating": rng.randint(1, 5),
+                "sentiment": rng.choice(["positive", "neutral", "negative"]),
+                "bot_classification": rng.choice(["real", "suspicious", "bot"]),
+                "confidence": rng.random(),
+            }
+            for _ in range(rng.randint(0, 12))
+        ],
+    }
+
+
+@pytest.fixture(autouse=True)
+def clean_index():
+    analytics.reset()
+    yield
+    analytics.reset()
+
+
+def _all_measures(group_by: list) -> dict:
+    return analytics.query(group_by, analytics.MEASURES, {}, hist_bins=5)
+
+
+def test_incremental_matches_rebuild_after_compactions():
+    rng = random.Random(7)
+    latest = {}
+    analytics.ensure_loaded(lambda: [])
+    for _ in range(2000):
+        business = _business(rng, rng.randint(0, 30))
+        latest[business["url"]] = business
+        analytics.index_analysis(business)
+
+    incremental = _all_measures(["category", "business", "rating"])
+    assert incremental["total"] == sum(len(b["reviews"]) for b in latest.values())
+
+    analytics.reset()
+    analytics.ensure_loaded(lambda: list(latest.values()))
+    rebuilt = _all_measures(["category", "business", "rating"])
+
+    key = lambda g: (g["category"], g["business"], g["rating"])
+    assert sorted(incremental["groups"], key=key) == sorted(rebuilt["groups"], key=key)
+    assert incremental["total"] == rebuilt["total"]
+
+
+def test_many_dimensions_only_allocate_present_groups():
+    rng = random.Random(3)
+    analytics.ensure_loaded(lambda: [_business(rng, i) for i in range(200)])
+    result = analytics.query(
+        ["business", "category", "rating", "sentiment", "bot_classification"],
+        ["count", "confidence_hist"], {}, hist_bins=100
+    )
+    assert sum(g["count"] for g in result["groups"]) == result["total"]
+    assert all(len(g["confidence_hist"]) == 100 for g in result["groups"])
+    assert all(sum(g["confidence_hist"]) == g["count"] for g in result["groups"])
@@ -0,0 +1,221 @@
+"""Pruebas del espejo de Firestore contra una colección falsa en memoria."""
+
+import pytest
+
+from firestore_mirror import FirestoreMirror
+
+
+class FakeChangeType:
+    def __init__(self, name: str):
+        self.name = name
+
+
+class FakeChange:
+    def __init__(self, kind: str, document):
+        self.type = FakeChangeType(kind)
+        self.document = document
+
+
+class FakeSnapshot:
+    def __init__(self, doc_id: str, data):
+        self.id = doc_id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self) -> dict:
+        return dict(self._data)
+
+
+class FakeDocument:
+    def __init__(self, collection, doc_id: str):
+        self._collection = collection
+        self._id = doc_id
+
+    def get(self) -> FakeSnapshot:
+        self._collection.reads += 1
+        return FakeSnapshot(self._id, self._collection.data.get(self._id))
+
+
+class FakeWatch:
+    def __init__(self, collection, callback):
+        self._collection = collection
+        self.callback = callback
+        self.is_active = True
+
+    def unsubscribe(self):
+        self.is_active = False
+        self._collection.watches.remove(self)
+
+
+class FakeCollection:
+    """
+    Colección con on_snapshot: la primera respuesta trae todos los documentos
+    (como Firestore) y luego cada escritura avisa a los listeners activos.
+    También hace de cliente para las lecturas en lote.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.reads = 0
+        self.batch_calls = 0
+        self.watches = []
+
+    def _docs(self) -> list:
+        return [FakeSnapshot(doc_id, data) for doc_id, data in self.data.items()]
+
+    def on_snapshot(self, callback) -> FakeWatch:
+        watch = FakeWatch(self, callback)
+        self.watches.append(watch)
+        changes = [FakeChange("ADDED", doc) for doc in self._docs()]
+        callback(self._docs(), changes, None)
+        return watch
+
+    def document(self, doc_id: str) -> FakeDocument:
+        return FakeDocument(self, doc_id)
+
+    def get_all(self, refs: list):
+        """Lectura en lote (como Client.get_all): una llamada, un documento por referencia."""
+        self.batch_calls += 1
+        for ref in refs:
+            self.reads += 1
+            yield FakeSnapshot(ref._id, self.data.get(ref._id))
+
+    def set(self, doc_id: str, business: dict, notify: bool = True):
+        kind = "MODIFIED" if doc_id in self.data else "ADDED"
+        self.data[doc_id] = business
+        if notify:
+            self._notify(FakeChange(kind, FakeSnapshot(doc_id, business)))
+
+    def delete(self, doc_id: str, notify: bool = True):
+        business = self.data.pop(doc_id)
+        if notify:
+            self._notify(FakeChange("REMOVED", FakeSnapshot(doc_id, business)))
+
+    def _notify(self, change: FakeChange):
+        for watch in list(self.watches):
+            watch.callback(self._docs(), [change], None)
+
+    def drop(self):
+        """Simula que el listener se cae (sin avisos hasta reiniciarlo)."""
+        for watch in list(self.watches):
+            watch.is_active = False
+        self.watches.clear()
+
+
+def _business(i: int, category: str = "cafe", reviews: int = 10) -> dict:
+    return {
+        "url": f"https://maps/place/{i}",
+        "category": {"category_id": category},
+        "reviews": [{"text": "x" * 100}] * reviews,
+    }
+
+
+@pytest.fixture
+def collection():
+    collection = FakeCollection()
+    for i in range(5):
+        collection.set(f"d{i}", _business(i, "cafe" if i % 2 else "bar"))
+    return collection
+
+
+def _urls(businesses: list) -> set:
+    return {b["url"] for b in businesses}
+
+
+def test_initial_load(collection):
+    mirror = FirestoreMirror(collection, collection, restart_backoff=0)
+    mirror.start()
+
+    assert mirror.is_active()
+    assert mirror.status()["documents"] == 5
+    assert len(mirror.get_by_category("cafe")) == 2
+    assert len(mirror.get_by_url("https://maps/place/0")["reviews"]) == 10
+    assert collection.reads == 0
+
+
+def test_updates_and_removals(collection):
+    mirror = FirestoreMirror(collection, collection)
+    mirror.start()
+
+    collection.set("d0", _business(0, "cafe", reviews=3))
+    collection.set("d9", _business(9, "bar"))
+    collection.delete("d1")
+
+    assert len(mirror.get_by_url("https://maps/place/0")["reviews"]) == 3
+    assert mirror.get_by_url("https://maps/place/1") is None
+    assert _urls(mirror.get_by_category("cafe")) == {
+        "https://maps/place/0", "https://maps/place/3"
+    }
+    assert _urls(mirror.get_by_category("bar")) == {
+        "https://maps/place/2", "https://maps/place/4", "https://maps/place/9"
+    }
+
+
+def test_eviction_with_lazy_refetch(collection):
+    # Entran las reseñas de 3 negocios (10 reseñas de ~300 bytes cada uno)
+    mirror = FirestoreMirror(collection, collection, max_review_bytes=3 * 3000)
+    mirror.start()
+    assert mirror.status()["evicted_reviews"] == 2
+    assert mirror.status()["review_bytes"] <= 3 * 3000
+
+    # Pedir un negocio descartado lo lee de Firestore y lo vuelve a guardar
+    business = mirror.get_by_url("https://maps/place/0")
+    assert len(business["reviews"]) == 10
+    assert collection.reads == 1
+    mirror.get_by_url("https://maps/place/0")
+    assert collection.reads == 1
+
+    # Recorrer todo trae las reseñas completas en una sola lectura en lote,
+    # sin desplazar a las más usadas
+    evicted = mirror.status()["evicted_reviews"]
+    businesses = mirror.get_all()
+    assert len(businesses) == 5
+    assert all(len(b["reviews"]) == 10 for b in businesses)
+    assert collection.batch_calls == 1
+    assert collection.reads == 1 + evicted
+    assert mirror.status()["review_bytes"] <= 3 * 3000
+
+    assert all(len(b["reviews"]) == 10 for b in mirror.get_by_category("cafe"))
+    assert collection.batch_calls == 2
+
+
+def test_fallback_when_listener_drops(collection):
+    mirror = FirestoreMirror(collection, collection, restart_backoff=3600)
+    mirror.start()
+
+    collection.drop()
+    # Sin listener no se lee del espejo (history_firestore va directo a Firestore)
+    assert not mirror.is_active()
+    assert collection.watches == []
+
+
+def test_restart_resyncs_changes_missed_while_down(collection):
+    mirror = FirestoreMirror(collection, collection, restart_backoff=0)
+    mirror.start()
+
+    collection.drop()
+    collection.delete("d1", notify=False)
+    collection.set("d2", _business(2, "cafe"), notify=False)
+    collection.set("d7", _business(7, "bar"), notify=False)
+
+    # El primer is_active() reinicia el listener; la primera respuesta reconstruye el espejo
+    mirror.is_active()
+    assert mirror.is_active()
+    assert mirror.status()["documents"] == 5
+    assert mirror.get_by_url("https://maps/place/1") is None
+    assert _urls(mirror.get_by_category("cafe")) == {
+        "https://maps/place/2", "https://maps/place/3"
+    }
+    assert _urls(mirror.get_by_category("bar")) == {
+        "https://maps/place/0", "https://maps/place/4", "https://maps/place/7"
+    }
+
+
+def test_stale_listener_is_ignored(collection):
+    mirror = FirestoreMirror(collection, collection)
+    mirror.start()
+    old_callback = collection.watches[0].callback
+    mirror.start()
+
+    old_callback([], [FakeChange("REMOVED", FakeSnapshot("d0", {}))], None)
+    assert mirror.get_by_url("https://maps/place/0") is not None
@@ -0,0 +1,52 @@
+"""Pruebas del historial en JSON local."""
+
+import json
+
+import pytest
+
+import history
+import trends
+
+
+@pytest.fixture(autouse=True)
+def temp_history(tmp_path, monkeypatch):
+    monkeypatch.setattr(history, "HISTORY_FILE", str(tmp_path / "analysis_history.json"))
+    monkeypatch.setattr(history, "READ_CHUNK", 64)
+
+
+def _businesses(count: int, tag: str) -> list:
+    return [
+        {"url": f"https://maps/place/{tag}{i}", "name": f"{tag} {i} " + "x" * 500, "reviews": []}
+        for i in range(count)
+    ]
+
+
+def test_save_is_atomic_for_streaming_readers(tmp_path):
+    history.save_history({"businesses": _businesses(50, "a")})
+    stream = history.iter_analyses()
+    first = next(stream)
+
+    # Reescribir mientras un export recorre el archivo
+    history.save_history({"businesses": _businesses(3, "b")})
+    urls = [first["url"]] + [b["url"] for b in stream]
+
+    assert urls == [f"https://maps/place/a{i}" for i in range(50)]
+    assert [p.name for p in tmp_path.iterdir()] == ["analysis_history.json"]
+    assert len(history.load_history()["businesses"]) == 3
+
+
+def test_damaged_file_is_not_silently_truncated():
+    text = json.dumps({"businesses": _businesses(20, "a")})
+    with open(history.HISTORY_FILE, "w", encoding="utf-8") as f:
+        f.write(text[:len(text) // 2])
+
+    with pytest.raises(json.JSONDecodeError):
+        list(history.iter_analyses())
+
+
+def test_place_id_is_saved_with_the_analysis():
+    url = "https://maps/place/a0"
+    history.add_analysis({"url": url, "reviews": []})
+
+    stored = history.load_history()["businesses"][0]
+    assert stored["place_id"] == trends.place_id(url)
@@ -0,0 +1,158 @@
+"""Pruebas de las consultas paginadas de history_firestore con una colección falsa."""
+
+import operator
+
+import pytest
+from google.api_core.exceptions import FailedPrecondition
+
+import history_firestore
+
+OPERATORS = {"==": operator.eq, ">=": operator.ge, "<": operator.lt}
+
+
+class FakeSnapshot:
+    def __init__(self, doc_id: str, data: dict):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self) -> dict:
+        return dict(self._data)
+
+    def value(self, field: str):
+        if field == "__name__":
+            return self.id
+        value = self._data
+        for part in field.split("."):
+            value = value.get(part)
+        return value
+
+
+class FakeQuery:
+    """Subconjunto de Query de Firestore: where, order_by, limit, start_after y stream."""
+
+    def __init__(self, db, filters=(), orders=(), limit=None, after=None):
+        self._db = db
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit
+        self._after = after
+
+    def _copy(self, **changes) -> "FakeQuery":
+        state = dict(filters=self._filters, orders=self._orders,
+                     limit=self._limit, after=self._after)
+        state.update(changes)
+        return FakeQuery(self._db, **state)
+
+    def where(self, field: str, op: str, value) -> "FakeQuery":
+        return self._copy(filters=self._filters + ((field, op, value),))
+
+    def select(self, fields: list) -> "FakeQuery":
+        return self
+
+    def order_by(self, field: str) -> "FakeQuery":
+        return self._copy(orders=self._orders + (field,))
+
+    def limit(self, count: int) -> "FakeQuery":
+        return self._copy(limit=count)
+
+    def start_after(self, snapshot: FakeSnapshot) -> "FakeQuery":
+        return self._copy(after=snapshot)
+
+    def stream(self):
+        fields = {f for f, _, _ in self._filters}
+        if "category.category_id" in fields and "analyzed_at" in fields and not self._db.composite_index:
+            raise FailedPrecondition("The query requires an index")
+
+        docs = [
+            doc for doc in self._db.docs
+            if all(OPERATORS[op](doc.value(f), v) for f, op, v in self._filters)
+        ]
+        key = lambda doc: tuple(doc.value(f) for f in self._orders)
+        docs.sort(key=key)
+        if self._after is not None:
+            docs = [doc for doc in docs if key(doc) > key(self._after)]
+        docs = docs[:self._limit]
+        self._db.reads += len(docs)
+        return iter(docs)
+
+
+class FakeDb:
+    def __init__(self, composite_index: bool = True):
+        self.docs = []
+        self.reads = 0
+        self.composite_index = composite_index
+
+    def collection(self, name: str) -> FakeQuery:
+        return FakeQuery(self)
+
+
+def _db(composite_index: bool = True) -> FakeDb:
+    db = FakeDb(composite_index)
+    for i in range(250):
+        db.docs.append(FakeSnapshot(f"doc{i:04d}", {
+            "url": f"https://maps/place/{i}",
+            "category": {"category_id": "salud" if i % 2 else "comida"},
+            "analyzed_at": f"2026-{1 + i % 5:02d}-{1 + i % 28:02d}T10:00:00",
+        }))
+    return db
+
+
+def _expected(db: FakeDb, category_id=None, since=None, until=None) -> set:
+    urls = set()
+    for doc in db.docs:
+        business = doc.to_dict()
+        analyzed_at = business["analyzed_at"]
+        if category_id and business["category"]["category_id"] != category_id:
+            continue
+        if since and analyzed_at < since:
+            continue
+        if until and analyzed_at[:len(until)] > until:
+            continue
+        urls.add(business["url"])
+    return urls
+
+
+@pytest.mark.parametrize("category_id,since,until", [
+    (None, None, None),
+    (None, "2026-02-10", None),
+    (None, None, "2026-02"),
+    ("salud", "2026-02", "2026-03-15"),
+])
+def test_range_is_read_in_the_query(monkeypatch, category_id, since, until):
+    db = _db()
+    monkeypatch.setattr(history_firestore, "get_firestore_client", lambda: db)
+
+    urls = [b["url"] for b in history_firestore.iter_analyses(category_id, since, until)]
+    expected = _expected(db, category_id, since, until)
+    assert len(urls) == len(set(urls))
+    assert set(urls) == expected
+    # Solo se leen los documentos del rango
+    assert db.reads == len(expected)
+
+
+def test_missing_composite_index_falls_back(monkeypatch):
+    db = _db(composite_index=False)
+    monkeypatch.setattr(history_firestore, "get_firestore_client", lambda: db)
+
+    urls = [b["url"] for b in history_firestore.iter_analyses("salud", "2026-02", "2026-03-15")]
+    assert set(urls) == _expected(db, "salud", "2026-02", "2026-03-15")
+
+
+def test_categories_without_sketch_are_computed(monkeypatch):
+    db = _db()
+    monkeypatch.setattr(history_firestore, "get_firestore_client", lambda: db)
+    monkeypatch.setattr(history_firestore, "_active_mirror", lambda: None)
+    # Solo "salud" tiene sketch guardado
+    monkeypatch.setattr(history_firestore, "_read_category_sketches",
+                        lambda db: ({"salud": {"reviews": 1}}, {}))
+    rebuilt = {}
+
+    def rebuild(db, category_id, businesses, version):
+        rebuilt[category_id] = len(businesses)
+        return {"reviews": 0}
+
+    monkeypatch.setattr(history_firestore, "_rebuild_category_sketch", rebuild)
+
+    category_sketches = history_firestore.get_category_sketches()
+    assert set(category_sketches) == {"salud", "comida"}
+    assert rebuilt == {"comida": 125}
@@ -0,0 +1,20 @@
+"""Pruebas del modo para negocios grandes."""
+
+from fastapi.testclient import TestClient
+
+import large_place
+import main
+
+
+def test_rejected_without_api_url(monkeypatch):
+    monkeypatch.setattr(large_place, "API_URL", "")
+    called = []
+    monkeypatch.setattr(main, "run_analysis", lambda request: called.append(request))
+
+    client = TestClient(main.app)
+    response = client.post("/analyze", json={
+        "url": "https://maps/place/clinica", "large_place": True
+    })
+    assert response.status_code == 400
+    assert "LARGE_PLACE_API_URL" in response.json()["detail"]
+    assert called == []
@@ -0,0 +1,42 @@
+"""Pruebas de la carga inicial de los índices en memoria."""
+
+import analytics
+import main
+import reviewers
+import search
+import storage
+
+
+def test_history_is_read_once(monkeypatch):
+    monkeypatch.setattr(storage, "backend_name", lambda: "firestore")
+    reads = []
+
+    def get_all_analyses():
+        reads.append(1)
+        # Un análisis guardado mientras se lee el historial
+        search.index_analysis(_business("nuevo", "personal amable"))
+        return [_business("viejo", "demora en la atención")]
+
+    monkeypatch.setattr(main, "get_all_analyses", get_all_analyses)
+    for index in (search, reviewers, analytics):
+        index.reset()
+    try:
+        main._load_indexes()
+        assert reads == [1]
+        assert search.search("demora")["total"] == 1
+        assert search.search("amable")["total"] == 1
+        assert reviewers.get_stats()["places"] == 1
+        assert analytics.query(["category"], ["count"], {})["total"] == 1
+    finally:
+        for index in (search, reviewers, analytics):
+            index.reset()
+
+
+def _business(name: str, text: str) -> dict:
+    return {
+        "url": f"https://maps/place/{name}",
+        "name": name,
+        "analyzed_at": "2026-01-01T10:00:00",
+        "category": {"category_id": "salud"},
+        "reviews": [{"author": name, "text": text, "rating": 4, "sentiment": "positive"}],
+    }
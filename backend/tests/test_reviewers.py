@@ -0,0 +1,69 @@
+"""Pruebas del índice de autores entre negocios."""
+
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+import reviewers
+
+OLD = int(datetime(2026, 1, 1).timestamp())
+NOW = datetime(2026, 6, 1)
+
+
+@pytest.fixture(autouse=True)
+def clean_index():
+    reviewers.reset()
+    yield
+    reviewers.reset()
+
+
+def _business(place: int, first_seen: int = None) -> dict:
+    review = {"author": "Spammer", "text": "Malo", "rating": 1}
+    if first_seen is not None:
+        review["first_seen"] = first_seen
+    return {
+        "url": f"https://maps/place/{place}",
+        # Re-analizado hoy: analyzed_at es reciente aunque la reseña sea vieja
+        "analyzed_at": NOW.isoformat(),
+        "reviews": [review],
+    }
+
+
+def test_rebuild_keeps_first_seen():
+    history = [_business(place, OLD) for place in range(3)]
+    reviewers.ensure_loaded(lambda: history)
+
+    burst = reviewers.is_burst("Spammer", "https://maps/place/9", 1, "Malo", NOW.timestamp())
+    assert not burst
+
+
+def test_rebuild_without_first_seen_uses_analyzed_at():
+    history = [_business(place) for place in range(3)]
+    reviewers.ensure_loaded(lambda: history)
+
+    burst = reviewers.is_burst("Spammer", "https://maps/place/9", 1, "Malo", NOW.timestamp())
+    assert burst
+
+
+def test_writes_during_startup_load_are_applied():
+    reviewers.start_loading()
+    reviewers.index_analysis(_business(5, OLD))
+    reviewers.finish_loading([_business(0, OLD)])
+
+    assert reviewers.get_stats()["places"] == 2
+
+
+def test_ensure_loaded_waits_for_startup_load():
+    reads = []
+    reviewers.start_loading()
+    waiter = threading.Thread(target=reviewers.ensure_loaded, args=(lambda: reads.append(1) or [],))
+    waiter.start()
+    time.sleep(0.05)
+    reviewers.finish_loading([_business(0, OLD)])
+    waiter.join(5)
+
+    assert not waiter.is_alive()
+    assert reads == []
+    assert reviewers.get_stats()["places"] == 1
@@ -0,0 +1,73 @@
+"""Pruebas del índice de búsqueda."""
+
+import os
+import time
+
+import pytest
+
+import search
+import storage
+
+
+@pytest.fixture(autouse=True)
+def temp_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "backend_name", lambda: "json")
+    monkeypatch.setattr(search, "INDEX_FILE", str(tmp_path / "index.pkl"))
+    monkeypatch.setattr(search, "JOURNAL_FILE", str(tmp_path / "index.journal"))
+    search.reset()
+    search.ensure_loaded(lambda: [])
+    yield
+    search.reset()
+
+
+def _business(texts: list) -> dict:
+    return {
+        "url": "https://maps/place/clinica",
+        "name": "Clínica",
+        "category": {"category_id": "salud"},
+        "reviews": [{"author": f"a{i}", "text": t, "rating": 5} for i, t in enumerate(texts)],
+    }
+
+
+def test_reanalysis_keeps_hits():
+    texts = [f"Buena atención número {i}" for i in range(50)]
+    search.index_analysis(_business(texts))
+    assert search.search("atencion")["total"] == 50
+
+    for _ in range(3):
+        search.index_analysis(_business(texts))
+        assert search.search("atencion")["total"] == 50
+
+
+def test_removed_terms_do_not_match():
+    search.index_analysis(_business(["demora en la atención"]))
+    search.index_analysis(_business(["personal amable"]))
+    assert search.search("demora")["total"] == 0
+    assert search.search("amable")["total"] == 1
+
+
+def _wait_for(path, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if os.path.exists(path):
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_snapshot_is_written_in_background(monkeypatch):
+    monkeypatch.setattr(search, "SNAPSHOT_EVERY", 3)
+    os.remove(search.INDEX_FILE)
+    for i in range(3):
+        search.index_analysis(_business([f"reseña número {i}"]))
+    assert _wait_for(search.INDEX_FILE)
+
+
+def test_firestore_backend_skips_disk(tmp_path, monkeypatch):
+    search.reset()
+    monkeypatch.setattr(storage, "backend_name", lambda: "firestore")
+    search.ensure_loaded(lambda: [_business(["personal amable"])])
+    search.index_analysis(_business(["demora en la atención"]))
+
+    assert search.search("demora")["total"] == 1
+    assert list(tmp_path.iterdir()) == []
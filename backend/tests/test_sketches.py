@@ -0,0 +1,31 @@
+"""Pruebas de la actualización incremental de los sketches por rubro."""
+
+import sketches
+
+
+def _review(i: int) -> dict:
+    return {"fingerprint": f"f{i}", "author": f"Autor {i}", "text": "x" * i, "rating": 1 + i % 5}
+
+
+def _business(reviews: list) -> dict:
+    business = {"category": {"category_id": "cafe"}, "reviews": reviews}
+    business["sketches"] = sketches.from_reviews(reviews)
+    return business
+
+
+def test_incremental_update_adds_new_reviews():
+    previous = _business([_review(i) for i in range(5)])
+    business = _business([_review(i) for i in range(8)])
+
+    updated = sketches.category_update(previous["sketches"], business, previous)
+    assert updated["reviews"] == 8
+    assert updated["ratings"] == business["sketches"]["ratings"]
+
+
+def test_dropped_reviews_force_a_rebuild():
+    # Al recortar por el tope se pierden reseñas previas: sumar solo las nuevas
+    # dejaría en el rubro las descartadas, a diferencia de la reconstrucción
+    previous = _business([_review(i) for i in range(5)])
+    business = _business([_review(i) for i in range(2, 8)])
+
+    assert sketches.category_update(previous["sketches"], business, previous) is None
@@ -0,0 +1,94 @@
+"""Pruebas de la transformación incremental de reseñas."""
+
+import asyncio
+import itertools
+
+import large_place
+import main
+
+URL = "https://maps/place/clinica"
+
+
+def _scrape(start: int, count: int = 50) -> dict:
+    return {
+        "business_name": "Clínica",
+        "sentiment_summary": {"POS": count},
+        "reviews": [
+            {
+                "username": f"autor {i}",
+                "review_text": f"Reseña número {i} sobre la atención",
+                "rating": 4,
+                "sentiment": "POS",
+            }
+            for i in range(start, start + count)
+        ],
+    }
+
+
+def _analyze(data: dict, previous: dict = None) -> dict:
+    result = main.transform_companion_response(data, URL, previous)
+    result["reviews"] = result["reviews"].to_dicts()
+    return result
+
+
+def test_missing_reviews_are_capped(monkeypatch):
+    monkeypatch.setattr(main, "MAX_STORED_REVIEWS", 120)
+    clock = itertools.count(1_000_000)
+    monkeypatch.setattr(main.time, "time", lambda: next(clock))
+
+    previous = None
+    for round_ in range(5):
+        previous = _analyze(_scrape(round_ * 50), previous)
+        assert len(previous["reviews"]) <= 120
+
+    texts = {r["text"] for r in previous["reviews"]}
+    # Se conservan las del último scraping y las vistas más recientemente
+    assert all(f"Reseña número {i} sobre la atención" in texts for i in range(130, 250))
+    assert previous["incremental"]["dropped_reviews"] == 50
+    # Los resúmenes siguen contando todas las reseñas vistas
+    assert previous["sentiment_summary"]["positive"] == 250
+
+
+def test_reanalysis_keeps_reviews_under_cap():
+    first = _analyze(_scrape(0))
+    second = _analyze(_scrape(25), first)
+
+    assert len(second["reviews"]) == 75
+    assert second["incremental"] == {"new_reviews": 25, "reused_reviews": 50, "dropped_reviews": 0}
+
+
+def test_large_place_uses_the_same_summaries(monkeypatch):
+    monkeypatch.setattr(main, "MAX_STORED_REVIEWS", 120)
+    monkeypatch.setattr(large_place, "WORKERS", 0)
+    monkeypatch.setattr(large_place, "PAGE_SIZE", 50)
+
+    async def fetch_companion(client, api_url, url, limit, offset=None):
+        # El negocio tiene 100 reseñas más
+        return _scrape(200 + offset, limit if offset < 100 else 0)
+
+    monkeypatch.setattr(main, "fetch_companion", fetch_companion)
+
+    previous = None
+    for round_ in range(4):
+        previous = _analyze(_scrape(round_ * 50), previous)
+    regular_total = previous["sentiment_summary"]["positive"]
+
+    result = asyncio.run(main.analyze_large_place(None, URL, previous))
+    assert result["incremental"]["new_reviews"] == 100
+    assert len(result["reviews"]) == 120
+    # Cambiar de modo no reinicia los totales: se suman las nuevas
+    assert result["sentiment_summary"]["positive"] == regular_total + 100
+    assert result["total_reviews"] == previous["total_reviews"] + 100
+
+
+def test_reviews_are_capped_by_document_size(monkeypatch):
+    monkeypatch.setattr(main, "MAX_STORED_REVIEW_BYTES", 20 * 1024)
+    data = _scrape(0)
+    for review in data["reviews"]:
+        review["review_text"] = "x" * 1000
+
+    result = _analyze(data)
+    size = sum(len(r["text"]) + len(r["author"]) + 200 for r in result["reviews"])
+    assert size <= 20 * 1024
+    assert result["incremental"]["dropped_reviews"] == 50 - len(result["reviews"])
+    assert result["sentiment_summary"]["positive"] == 50
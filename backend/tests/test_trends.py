@@ -0,0 +1,82 @@
+"""Pruebas de las series de tiempo por negocio."""
+
+from datetime import datetime
+
+import pytest
+
+import storage
+import trends
+
+
+class FakeRemote:
+    """Backend con la misma interfaz de series que history_firestore."""
+
+    def __init__(self):
+        self.series = {}
+
+    def append_trend_record(self, place_id: str, record: bytes) -> bool:
+        self.series[place_id] = self.series.get(place_id, b"") + record
+        return True
+
+    def get_trend_records(self, place_id: str):
+        return self.series.get(place_id)
+
+
+def _business(day: int, positive: int) -> dict:
+    return {
+        "url": "https://maps/place/clinica",
+        "analyzed_at": f"2026-01-{day:02d}T12:00:00",
+        "total_reviews": positive,
+        "average_rating": 4.5,
+        "sentiment_summary": {"positive": positive, "neutral": 0, "negative": 0},
+        "bot_stats": {"real": positive, "suspicious": 0, "bot": 0},
+    }
+
+
+@pytest.fixture
+def local(tmp_path, monkeypatch):
+    monkeypatch.setattr(trends, "TRENDS_DIR", str(tmp_path / "trends"))
+    monkeypatch.setattr(storage, "backend_name", lambda: "json")
+
+
+@pytest.fixture
+def remote(tmp_path, monkeypatch):
+    fake = FakeRemote()
+    monkeypatch.setattr(trends, "TRENDS_DIR", str(tmp_path / "trends"))
+    monkeypatch.setattr(storage, "backend_name", lambda: "firestore")
+    monkeypatch.setattr(storage, "backend", lambda: fake)
+    return fake
+
+
+def _timestamp(day: int) -> float:
+    return datetime.fromisoformat(f"2026-01-{day:02d}T12:00:00").timestamp()
+
+
+def _record_days(days: int) -> str:
+    pid = None
+    for day in range(1, days + 1):
+        pid = trends.record_snapshot(_business(day, day))
+    return pid
+
+
+def test_local_series(local):
+    pid = _record_days(10)
+    trend = trends.get_trend(pid, points=3)
+    assert trend["total_snapshots"] == 10
+    assert trend["series"]["positive"][-1] == 10
+
+
+def test_firestore_series_skips_local_disk(remote, tmp_path):
+    pid = _record_days(10)
+    assert not (tmp_path / "trends").exists()
+    assert len(remote.series[pid]) == 10 * trends.RECORD.size
+
+    start = _timestamp(3)
+    end = _timestamp(5)
+    trend = trends.get_trend(pid, start, end)
+    assert trend["total_snapshots"] == 10
+    assert trend["series"]["positive"] == [3, 4, 5]
+
+
+def test_firestore_missing_series(remote):
+    assert trends.get_trend("no-existe") is None
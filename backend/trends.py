@@ -0,0 +1,172 @@
+"""
+Series de tiempo compactas del sentimiento por negocio.
+Cada análisis agrega un registro binario de tamaño fijo a una serie
+append-only por negocio, para consultar tendencias sin guardar documentos completos.
+Las series se guardan en el mismo backend que el historial: con Firestore,
+en bloques de bytes por negocio (el disco de la instancia no es persistente);
+con JSON local, en un archivo por negocio.
+"""
+
+import hashlib
+import io
+import os
+import struct
+import threading
+from datetime import datetime
+from typing import Optional
+
+import storage
+
+# Carpeta donde se guardan las series con JSON local (un archivo por negocio)
+TRENDS_DIR = os.path.join(os.path.dirname(__file__), "trends_data")
+
+# Formato de cada registro:
+# timestamp, total_reviews, average_rating,
+# positive, neutral, negative, real, suspicious, bot
+RECORD = struct.Struct("<dIf6I")
+FIELDS = [
+    "timestamp", "total_reviews", "average_rating",
+    "positive", "neutral", "negative", "real", "suspicious", "bot"
+]
+
+# Máximo de puntos que devuelve una consulta
+MAX_POINTS = 1000
+
+_lock = threading.Lock()
+
+
+def place_id(url: str) -> str:
+    """Genera el ID del negocio a partir de la URL (igual que en Firestore)."""
+    return hashlib.md5(url.encode()).hexdigest()[:16]
+
+
+def _series_path(pid: str) -> str:
+    """Ruta del archivo binario de un negocio."""
+    return os.path.join(TRENDS_DIR, f"{pid}.bin")
+
+
+def _remote():
+    """Módulo de Firestore si es el historial activo (None con JSON local)."""
+    if storage.backend_name() == "firestore":
+        return storage.backend()
+    return None
+
+
+def record_snapshot(business_data: dict) -> Optional[str]:
+    """
+    Agrega un registro compacto con el estado actual del negocio.
+    Retorna el ID del negocio o None si no se pudo guardar.
+    """
+    url = business_data.get("url")
+    if not url:
+        return None
+
+    pid = place_id(url)
+    sentiment = business_data.get("sentiment_summary", {})
+    bots = business_data.get("bot_stats", {})
+
+    analyzed_at = business_data.get("analyzed_at")
+    try:
+        timestamp = datetime.fromisoformat(analyzed_at).timestamp()
+    except (TypeError, ValueError):
+        timestamp = datetime.now().timestamp()
+
+    row = RECORD.pack(
+        timestamp,
+        int(business_data.get("total_reviews", 0) or 0),
+        float(business_data.get("average_rating", 0) or 0),
+        int(sentiment.get("positive", 0)),
+        int(sentiment.get("neutral", 0)),
+        int(sentiment.get("negative", 0)),
+        int(bots.get("real", 0)),
+        int(bots.get("suspicious", 0)),
+        int(bots.get("bot", 0)),
+    )
+
+    remote = _remote()
+    if remote is not None:
+        return pid if remote.append_trend_record(pid, row) else None
+
+    try:
+        with _lock:
+            os.makedirs(TRENDS_DIR, exist_ok=True)
+            with open(_series_path(pid), "ab") as f:
+                f.write(row)
+        return pid
+    except IOError:
+        return None
+
+
+def _read_record(f, index: int) -> tuple:
+    """Lee el registro número `index` del archivo."""
+    f.seek(index * RECORD.size)
+    return RECORD.unpack(f.read(RECORD.size))
+
+
+def _read_timestamp(f, index: int) -> float:
+    """Lee solo el timestamp del registro número `index`."""
+    f.seek(index * RECORD.size)
+    return struct.unpack("<d", f.read(8))[0]
+
+
+def _bisect(f, count: int, timestamp: float) -> int:
+    """Busca el primer registro con timestamp >= al dado (búsqueda binaria)."""
+    lo, hi = 0, count
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if _read_timestamp(f, mid) < timestamp:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def _query(pid: str, f, count: int, start: Optional[float], end: Optional[float],
+           points: int) -> dict:
+    """Recorta y reduce la serie leyendo solo los registros necesarios de `f`."""
+    points = max(1, min(points, MAX_POINTS))
+
+    lo = _bisect(f, count, start) if start is not None else 0
+    hi = _bisect(f, count, end + 1e-6) if end is not None else count
+
+    available = max(hi - lo, 0)
+    if available <= points:
+        indexes = range(lo, hi)
+    else:
+        # Último registro de cada tramo, así el último punto siempre es el más reciente
+        indexes = [lo + ((i + 1) * available) // points - 1 for i in range(points)]
+
+    # Columnas de la serie
+    series = {field: [] for field in FIELDS}
+    for index in indexes:
+        for field, value in zip(FIELDS, _read_record(f, index)):
+            series[field].append(round(value, 2) if field == "average_rating" else value)
+
+    return {
+        "place_id": pid,
+        "total_snapshots": count,
+        "in_range": available,
+        "points": len(series["timestamp"]),
+        "series": series,
+    }
+
+
+def get_trend(pid: str, start: Optional[float] = None, end: Optional[float] = None,
+              points: int = 200) -> Optional[dict]:
+    """
+    Obtiene la serie de un negocio entre `start` y `end` (epoch en segundos),
+    reducida a lo sumo a `points` puntos (se toma el último registro de cada tramo).
+    Retorna None si el negocio no tiene registros.
+    """
+    remote = _remote()
+    if remote is not None:
+        data = remote.get_trend_records(pid)
+        if not data:
+            return None
+        return _query(pid, io.BytesIO(data), len(data) // RECORD.size, start, end, points)
+
+    path = _series_path(pid)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return _query(pid, f, os.path.getsize(path) // RECORD.size, start, end, points)
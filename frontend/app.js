@@ -6,6 +6,8 @@
 // ============== Configuración ==============
 const API_BASE_URL = 'https://analisisdesentimientos2026-1.onrender.com';
 let historyData = [];
+let historyByUrl = new Map();
+let historyCursor = null;
 let currentBusiness = null;
 let currentCategory = 'all';
 let sentimentChart = null;
@@ -20,18 +22,13 @@ async function initApp() {
     await loadHistory();
     setupEventListeners();
     updateCategoryCounts();
+    subscribeToEvents();
 }
 
 // ============== Carga de Datos ==============
 async function loadHistory() {
     try {
-        const response = await fetch(`${API_BASE_URL}/history`);
-        if (response.ok) {
-            const data = await response.json();
-            historyData = data.businesses || [];
-        } else {
-            throw new Error('Backend no disponible');
-        }
+        await syncHistory();
     } catch (error) {
         console.log('Usando datos locales:', error.message);
         // Cargar datos mock si backend no disponible
@@ -40,6 +37,7 @@ async function loadHistory() {
             if (mockResponse.ok) {
                 const mockData = await mockResponse.json();
                 historyData = mockData.businesses || [];
+                historyByUrl = new Map(historyData.map((b, i) => [b.url || `mock-${i}`, b]));
             }
         } catch {
             historyData = [];
@@ -50,6 +48,146 @@ async function loadHistory() {
     renderCategoryChart();
 }
 
+/**
+ * Sincroniza el historial: usa la caché local (IndexedDB) y pide al backend
+ * solo los negocios que cambiaron desde el último cursor.
+ */
+async function syncHistory() {
+    const db = await openCache();
+
+    if (!db) {
+        // Sin IndexedDB: descargar todo como antes
+        const response = await fetch(`${API_BASE_URL}/history`);
+        if (!response.ok) throw new Error('Backend no disponible');
+        const data = await response.json();
+        historyByUrl = new Map((data.businesses || []).map(b => [b.url, b]));
+        historyData = [...historyByUrl.values()];
+        return;
+    }
+
+    if (historyCursor === null) {
+        const cached = await readCache(db);
+        historyByUrl = new Map(cached.businesses.map(b => [b.url, b]));
+        historyCursor = cached.cursor || '';
+        historyData = [...historyByUrl.values()];
+    }
+
+    let hasMore = true;
+    while (hasMore) {
+        const response = await fetch(`${API_BASE_URL}/history/changes?since=${encodeURIComponent(historyCursor)}`);
+        if (!response.ok) throw new Error('Backend no disponible');
+        const changes = await response.json();
+
+        if (changes.reset) historyByUrl.clear();
+        changes.deleted.forEach(url => historyByUrl.delete(url));
+        changes.businesses.forEach(b => historyByUrl.set(b.url, b));
+
+        await writeCache(db, changes);
+        historyCursor = changes.cursor;
+        hasMore = changes.has_more;
+    }
+
+    historyData = [...historyByUrl.values()];
+}
+
+// ============== Actualizaciones en vivo ==============
+/**
+ * Se suscribe al canal de eventos del backend (SSE). Cada análisis llega
+ * como un resumen del negocio más el cambio en las estadísticas por rubro.
+ */
+function subscribeToEvents() {
+    if (!window.EventSource) return;
+
+    const source = new EventSource(`${API_BASE_URL}/events`);
+
+    source.addEventListener('analysis', (e) => {
+        const { business, stats_delta } = JSON.parse(e.data);
+        const existing = historyByUrl.get(business.url);
+        // Análisis hecho desde este mismo dashboard: ya está actualizado
+        if (existing && existing.updated_at === business.updated_at) return;
+
+        // Las reseñas no vienen en el evento: se traen al seleccionar el negocio
+        historyByUrl.set(business.url, { ...existing, ...business, _stale: true });
+        historyData = [...historyByUrl.values()];
+
+        updateCategoryCounts();
+        populateBusinessSelect();
+        applyStatsDelta(stats_delta);
+    });
+
+    source.addEventListener('clear', () => {
+        historyByUrl.clear();
+        historyData = [];
+        updateCategoryCounts();
+        populateBusinessSelect();
+        renderCategoryChart();
+    });
+
+    // El backend pide resincronizar si este cliente se atrasó
+    source.addEventListener('resync', () => loadHistory());
+}
+
+function applyStatsDelta(statsDelta) {
+    if (!comparisonChart) return renderCategoryChart();
+
+    const { labels, datasets } = comparisonChart.data;
+    Object.values(statsDelta).forEach(delta => {
+        let index = labels.indexOf(delta.category_name);
+        if (index === -1) {
+            labels.push(delta.category_name);
+            datasets.forEach(ds => ds.data.push(0));
+            index = labels.length - 1;
+        }
+        datasets[0].data[index] += delta.sentiment_totals.positive;
+        datasets[1].data[index] += delta.sentiment_totals.neutral;
+        datasets[2].data[index] += delta.sentiment_totals.negative;
+    });
+    comparisonChart.update();
+}
+
+// ============== Caché local (IndexedDB) ==============
+const CACHE_DB_NAME = 'sentiment-dashboard';
+let cacheDb;
+
+function openCache() {
+    if (cacheDb !== undefined) return Promise.resolve(cacheDb);
+    if (!window.indexedDB) return Promise.resolve(cacheDb = null);
+
+    return new Promise(resolve => {
+        const request = indexedDB.open(CACHE_DB_NAME, 1);
+        request.onupgradeneeded = () => {
+            request.result.createObjectStore('businesses', { keyPath: 'url' });
+            request.result.createObjectStore('meta');
+        };
+        request.onsuccess = () => resolve(cacheDb = request.result);
+        request.onerror = () => resolve(cacheDb = null);
+    });
+}
+
+function readCache(db) {
+    return new Promise((resolve, reject) => {
+        const tx = db.transaction(['businesses', 'meta'], 'readonly');
+        const result = { businesses: [], cursor: '' };
+        tx.objectStore('businesses').getAll().onsuccess = e => { result.businesses = e.target.result; };
+        tx.objectStore('meta').get('cursor').onsuccess = e => { result.cursor = e.target.result || ''; };
+        tx.oncomplete = () => resolve(result);
+        tx.onerror = () => reject(tx.error);
+    });
+}
+
+function writeCache(db, changes) {
+    return new Promise((resolve, reject) => {
+        const tx = db.transaction(['businesses', 'meta'], 'readwrite');
+        const store = tx.objectStore('businesses');
+        if (changes.reset) store.clear();
+        changes.deleted.forEach(url => store.delete(url));
+        changes.businesses.forEach(b => store.put(b));
+        tx.objectStore('meta').put(changes.cursor, 'cursor');
+        tx.oncomplete = () => resolve();
+        tx.onerror = () => reject(tx.error);
+    });
+}
+
 function populateBusinessSelect() {
     const select = document.getElementById('businessSelect');
     const filtered = currentCategory === 'all'
@@ -156,7 +294,10 @@ async function analyzeUrl() {
 
         if (response.ok) {
             const result = await response.json();
-            historyData.push(result);
+            historyByUrl.set(result.url, result);
+            historyData = [...historyByUrl.values()];
+            // Traer los cambios (incluye este análisis) para actualizar la caché
+            syncHistory().catch(error => console.log('No se pudo sincronizar:', error.message));
             updateCategoryCounts();
             populateBusinessSelect();
             selectBusiness(result);
@@ -167,19 +308,27 @@ async function analyzeUrl() {
 
             // Mostrar notificación
             showToast(`✅ ${result.name} analizado (${result.category?.category_name})`);
+        } else if (response.status === 429) {
+            const retryAfter = response.headers.get('Retry-After') || '60';
+            throw new Error(`Hay demasiados análisis en curso. Intenta de nuevo en ${retryAfter} segundos.`);
         } else {
-            throw new Error('Error al analizar');
+            throw new Error('Error al analizar la URL. Verifica que el backend esté corriendo.');
         }
     } catch (error) {
         console.error('Error:', error);
-        alert('Error al analizar la URL. Verifica que el backend esté corriendo.');
+        alert(error.message || 'Error al analizar la URL. Verifica que el backend esté corriendo.');
     } finally {
         showLoading(false);
     }
 }
 
 // ============== Selección de Negocio ==============
-function selectBusiness(business) {
+async function selectBusiness(business) {
+    if (business._stale) {
+        // Llegó por el canal en vivo sin reseñas: sincronizar para traerlas
+        await syncHistory().catch(error => console.log('No se pudo sincronizar:', error.message));
+        business = historyByUrl.get(business.url) || business;
+    }
     currentBusiness = business;
     updateStats();
     updateBotStats();
@@ -428,7 +577,7 @@ function formatSentiment(sentiment) {
 }
 
 function formatIndicator(indicator) {
-    return { 'single_review': '1 reseña', 'short_text': 'Texto corto', 'generic_phrases': 'Frase genérica', 'no_details': 'Sin detalles', 'extreme_rating': 'Rating extremo' }[indicator] || indicator;
+    return { 'single_review': '1 reseña', 'short_text': 'Texto corto', 'generic_phrases': 'Frase genérica', 'no_details': 'Sin detalles', 'extreme_rating': 'Rating extremo', 'multi_place_burst': 'Ráfaga en varios negocios' }[indicator] || indicator;
 }
 
 function filterReviews(filter) {